@@ -0,0 +1,76 @@
+import random
+from typing import Dict, List
+
+
+def _scalar(rng: random.Random, type_name: str):
+    if type_name == "BOOLEAN":
+        return rng.random() < 0.5
+    if type_name == "FLOAT":
+        return rng.random() * 1000 if rng.random() < 0.5 else rng.randint(0, 1000)
+    return "".join(rng.choice("abcdefghij") for _ in range(rng.randint(1, 30)))
+
+
+def wide_rows(rows: int, columns: int = 1000, seed: int = 0) -> List[Dict]:
+    """Flat records of `columns` scalar columns of fixed types, about 5% of the values missing"""
+    rng = random.Random(seed)
+    column_types = [rng.choice(("BOOLEAN", "FLOAT", "STRING")) for _ in range(columns)]
+    return [{f"col_{i}": (None if rng.random() < 0.05 else _scalar(rng, column_type))
+             for i, column_type in enumerate(column_types)}
+            for _ in range(rows)]
+
+
+def deep_rows(rows: int, depth: int = 20, seed: int = 0) -> List[Dict]:
+    """Records nesting `depth` levels of records, with a few scalar columns at every level"""
+    rng = random.Random(seed)
+    records = []
+    for _ in range(rows):
+        record = {}
+        level = record
+        for i in range(depth):
+            level["id"] = rng.randint(0, 1000)
+            level["label"] = _scalar(rng, "STRING")
+            level["flag"] = rng.random() < 0.5
+            level[f"level_{i + 1}"] = {}
+            level = level[f"level_{i + 1}"]
+        level["leaf"] = _scalar(rng, "FLOAT")
+        records.append(record)
+    return records
+
+
+def ragged_rows(rows: int, max_items: int = 20, keys: int = 30, seed: int = 0) -> List[Dict]:
+    """Records holding lists of records of varying lengths, whose items each have a random subset of `keys` keys"""
+    rng = random.Random(seed)
+    key_types = [rng.choice(("BOOLEAN", "FLOAT", "STRING")) for _ in range(keys)]
+    return [{"id": rng.randint(0, 10 ** 6),
+             "items": [{f"key_{k}": _scalar(rng, key_types[k]) for k in rng.sample(range(keys), rng.randint(1, keys))}
+                       for _ in range(rng.randint(0, max_items))],
+             "tags": [_scalar(rng, "STRING") for _ in range(rng.randint(0, 5))]}
+            for _ in range(rows)]
+
+
+def type_drift_rows(rows: int, columns: int = 50, seed: int = 0) -> List[Dict]:
+    """Records whose columns start as BOOLEAN or FLOAT and drift to wider types (STRING, then RECORD) at random
+    points of the stream, so that columns keep widening until the end"""
+    rng = random.Random(seed)
+    drifts = [sorted(rng.randint(0, rows) for _ in range(2)) for _ in range(columns)]
+    first_types = [rng.choice(("BOOLEAN", "FLOAT")) for _ in range(columns)]
+    records = []
+    for row in range(rows):
+        record = {}
+        for i, (to_string, to_record) in enumerate(drifts):
+            if row >= to_record and rng.random() < 0.5:
+                record[f"col_{i}"] = {"value": _scalar(rng, first_types[i])}
+            elif row >= to_string and rng.random() < 0.5:
+                record[f"col_{i}"] = _scalar(rng, "STRING")
+            else:
+                record[f"col_{i}"] = _scalar(rng, first_types[i])
+        records.append(record)
+    return records
+
+
+scenarios = {
+    "wide": wide_rows,
+    "deep": deep_rows,
+    "ragged": ragged_rows,
+    "type_drift": type_drift_rows,
+}
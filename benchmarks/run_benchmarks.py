@@ -0,0 +1,120 @@
+import argparse
+import json
+import multiprocessing
+import resource
+import sys
+import time
+import tracemalloc
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List
+
+if __package__ in (None, ""):
+    # run as a script: make the repository root importable
+    sys.path.insert(0, __file__.rsplit("/benchmarks/", 1)[0])
+
+from benchmarks.payloads import scenarios  # noqa: E402
+from bq_schema_generator.schema_generator import SchemaGenerator  # noqa: E402
+
+
+def _infer(records: List[Dict], generator_options: Dict) -> None:
+    schema_generator = SchemaGenerator(**generator_options)
+    schema_generator.update_schema_columns(records)
+    schema_generator.get_bq_schema()
+
+
+def run_scenario(scenario: str, rows: int, repeat: int = 3, generator_options: Dict = None) -> Dict:
+    """Runs a scenario and returns its throughput (best of `repeat` runs), the memory allocated while inferring
+    (measured in a separate run, as tracemalloc slows python down) and how much inferring grew the peak RSS of the
+    process beyond the one reached while building the payload"""
+    generator_options = generator_options if generator_options is not None else {}
+    records = scenarios[scenario](rows)
+    # ru_maxrss is in kilobytes on linux
+    payload_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        _infer(records, generator_options)
+        timings.append(time.perf_counter() - start)
+
+    tracemalloc.start()
+    _infer(records, generator_options)
+    _, peak_allocated = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return {
+        "scenario": scenario,
+        "rows": rows,
+        "seconds": min(timings),
+        "rows_per_sec": rows / min(timings),
+        "peak_allocated_bytes": peak_allocated,
+        "payload_rss_bytes": payload_rss,
+        "rss_growth_bytes": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024 - payload_rss,
+    }
+
+
+def run_benchmarks(scenario_names: List[str], rows: int, repeat: int = 3, generator_options: Dict = None) -> List[Dict]:
+    """Runs every scenario in a fresh process, so that RSS is measured per scenario"""
+    results = []
+    for scenario in scenario_names:
+        with ProcessPoolExecutor(max_workers=1, mp_context=multiprocessing.get_context("spawn")) as executor:
+            results.append(executor.submit(run_scenario, scenario, rows, repeat, generator_options).result())
+    return results
+
+
+def find_regressions(results: List[Dict], baseline: List[Dict], max_regression: float) -> List[str]:
+    """Lists the scenarios whose throughput dropped, or whose allocated memory grew, by more than max_regression
+    (e.g. 0.1 for 10%) from baseline. RSS is too noisy to be compared, the allocated memory being deterministic"""
+    baseline_results = {result["scenario"]: result for result in baseline}
+    regressions = []
+    for result in results:
+        if result["scenario"] not in baseline_results:
+            continue
+        expected = baseline_results[result["scenario"]]["rows_per_sec"]
+        if result["rows_per_sec"] < expected * (1 - max_regression):
+            regressions.append(f"{result['scenario']}: {result['rows_per_sec']:.0f} rows/sec, "
+                               f"baseline {expected:.0f} rows/sec")
+        expected = baseline_results[result["scenario"]].get("peak_allocated_bytes")
+        if expected is not None and result["peak_allocated_bytes"] > expected * (1 + max_regression):
+            regressions.append(f"{result['scenario']}: {result['peak_allocated_bytes']} bytes allocated, "
+                               f"baseline {expected} bytes allocated")
+    return regressions
+
+
+def main(argv: List[str] = None) -> int:
+    parser = argparse.ArgumentParser(description="Measures the throughput of SchemaGenerator on synthetic payloads")
+    parser.add_argument("--scenarios", nargs="+", choices=sorted(scenarios), default=sorted(scenarios))
+    parser.add_argument("--rows", type=int, default=2000)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--shape-cache-size", type=int, default=0)
+    parser.add_argument("--output", help="file to save the results to, as JSON")
+    parser.add_argument("--baseline", help="results saved by a previous run to compare throughput against")
+    parser.add_argument("--max-regression", type=float, default=0.1,
+                        help="fail if throughput dropped (or allocated memory grew) by more than this fraction of "
+                             "the baseline's")
+    args = parser.parse_args(argv)
+
+    results = run_benchmarks(args.scenarios, args.rows, args.repeat, {"shape_cache_size": args.shape_cache_size})
+
+    print(f"{'scenario':<12}{'rows':>8}{'rows/sec':>12}{'allocated (MB)':>16}{'RSS growth (MB)':>17}"
+          f"{'payload RSS (MB)':>18}")
+    for result in results:
+        print(f"{result['scenario']:<12}{result['rows']:>8}{result['rows_per_sec']:>12.0f}"
+              f"{result['peak_allocated_bytes'] / 2 ** 20:>16.1f}{result['rss_growth_bytes'] / 2 ** 20:>17.1f}"
+              f"{result['payload_rss_bytes'] / 2 ** 20:>18.1f}")
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = find_regressions(results, json.load(f), args.max_regression)
+        for regression in regressions:
+            print(f"REGRESSION {regression}", file=sys.stderr)
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,12 +1,60 @@
+import os
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+from typing import Callable, Iterable, List, Dict, Tuple, Union
+from bq_schema_generator.readers import iter_file
+from bq_schema_generator.schema_generator import InferenceInfo, SchemaGenerator
 
-from typing import List, Dict
-from bq_schema_generator.schema_generator import SchemaGenerator
 
-
-def batch_to_bq_schema(batch: List[List[Dict]]) -> List[Dict]:
+def batch_to_bq_schema(batch: List[List[Dict]], with_info: bool = False,
+                       **generator_options) -> Union[List[Dict], Tuple[List[Dict], InferenceInfo]]:
     """ Takes a batch of records retrieved from an API call and converts it to a list of dictionaries which can be
-    consumed by the Big Query API as a schema"""
-    schema_generator = SchemaGenerator()
+    consumed by the Big Query API as a schema
+    generator_options are passed on to the SchemaGenerator, e.g. record_sampling="bernoulli" and
+    record_sample_rate=0.1 to only inspect about 10% of the records, or stop_after_unchanged=1000 to stop once
+    1000 consecutive records did not change the schema. With with_info, the InferenceInfo telling how many records
+    were examined and whether the schema converged is returned along with the schema"""
+    schema_generator = SchemaGenerator(**generator_options)
     schema_generator.update_schema_columns(batch)
 
+    if with_info:
+        return schema_generator.get_bq_schema(), schema_generator.inference_info()
+    return schema_generator.get_bq_schema()
+
+
+# a shard of records for infer_parallel: the path of a file, a picklable callable returning the records,
+# or the records themselves
+Shard = Union[str, os.PathLike, Callable[[], Iterable[Dict]], Iterable[Dict]]
+
+
+def _infer_shard(shard: Shard, generator_options: Dict) -> bytes:
+    """Runs a SchemaGenerator over a shard in a worker process, returning its state"""
+    if isinstance(shard, (str, os.PathLike)):
+        records = iter_file(shard)
+    elif callable(shard):
+        records = shard()
+    else:
+        records = shard
+    schema_generator = SchemaGenerator(**generator_options)
+    schema_generator.update_schema_columns(records)
+    return schema_generator.dump_state()
+
+
+def infer_parallel(shards: Iterable[Shard], workers: int = None, default_column_types: Dict = None,
+                   **generator_options) -> List[Dict]:
+    """ Takes several shards of records (e.g. the files of a dataset), runs one SchemaGenerator per shard
+    in a pool of `workers` processes and merges them into a list of dictionaries which can be consumed by
+    the Big Query API as a schema, the same one batch_to_bq_schema would generate over all the records.
+    A shard is the path of a newline-delimited JSON or CSV file, or a picklable callable (e.g. a module level
+    function or a functools.partial of one) returning an iterable of records, both read within the worker.
+    A shard can also be a picklable iterable of records, but every record then has to be pickled by this process,
+    which costs about as much as inferring its schema.
+    generator_options are passed on to every SchemaGenerator, as with batch_to_bq_schema."""
+    schema_generator = SchemaGenerator(default_column_types, **generator_options)
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        for shard_state in executor.map(partial(_infer_shard, generator_options=generator_options), shards):
+            shard_generator = SchemaGenerator(**generator_options)
+            shard_generator.load_state(shard_state)
+            schema_generator.merge(shard_generator)
+
     return schema_generator.get_bq_schema()
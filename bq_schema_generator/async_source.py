@@ -0,0 +1,46 @@
+import asyncio
+from typing import AsyncIterator, Dict, Iterable
+
+_CLOSED = object()
+
+
+class MemoryRecordSource(object):
+    """
+    In-memory asynchronous source of records, standing in for streams such as aiokafka consumers in tests.
+    Records can be given upfront and/or put later by a producer task, iteration ending once the source is closed
+    (right away if records are given and closed is left to its default).
+    """
+
+    def __init__(self, records: Iterable[Dict] = None, closed: bool = None):
+        # the queue is created once iterated, inside the event loop (python < 3.10 binds queues on creation)
+        self._queue = None
+        self._pending = list(records) if records is not None else []
+        if closed if closed is not None else records is not None:
+            self.close()
+
+    def _get_queue(self) -> asyncio.Queue:
+        if self._queue is None:
+            self._queue = asyncio.Queue()
+            for record in self._pending:
+                self._queue.put_nowait(record)
+            self._pending = None
+        return self._queue
+
+    async def put(self, record: Dict) -> None:
+        await self._get_queue().put(record)
+
+    def close(self) -> None:
+        if self._queue is None:
+            self._pending.append(_CLOSED)
+        else:
+            self._queue.put_nowait(_CLOSED)
+
+    def __aiter__(self) -> AsyncIterator[Dict]:
+        return self
+
+    async def __anext__(self) -> Dict:
+        record = await self._get_queue().get()
+        if record is _CLOSED:
+            self._queue.put_nowait(_CLOSED)
+            raise StopAsyncIteration
+        return record
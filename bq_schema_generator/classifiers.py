@@ -0,0 +1,85 @@
+import datetime
+import decimal
+import re
+
+# strings longer than this cannot hold any of the detected types, and are typed as STRING without further checks
+MAX_CLASSIFIED_LENGTH = 40
+
+# python types typed more precisely when types are detected, the other ones keeping their type_ mapping.
+# ints that do not fit in 64 bits are further checked by classify_integer
+detected_python_types = {
+    int: "INTEGER",
+    datetime.datetime: "TIMESTAMP",
+    datetime.date: "DATE",
+    decimal.Decimal: "NUMERIC",
+}
+
+# left side is loose, right side is precise/correct
+# i.e. right side can overwrite left side
+detected_type_hierarchy = {
+    "BOOLEAN": ["STRING", "RECORD"],
+    "INTEGER": ["NUMERIC", "FLOAT", "STRING", "RECORD"],
+    "NUMERIC": ["FLOAT", "STRING", "RECORD"],
+    "FLOAT": ["STRING", "RECORD"],
+    "DATE": ["TIMESTAMP", "STRING", "RECORD"],
+    "TIMESTAMP": ["STRING", "RECORD"],
+    "STRING": ["RECORD"],
+    "RECORD": []
+}
+
+# every type a string can be classified as
+classified_types = ("BOOLEAN", "INTEGER", "NUMERIC", "FLOAT", "DATE", "TIMESTAMP", "STRING")
+
+# numbers with leading zeros (e.g. zip codes) are kept as strings, and integers that may not fit in 64 bits are
+# NUMERIC, as are decimals within its precision (29 integer and 9 fractional digits). Longer numbers and numbers
+# with an exponent are FLOAT
+_integer = re.compile(r"[+-]?(?:0|[1-9][0-9]{0,17})")
+_numeric = re.compile(r"[+-]?(?:(?:0|[1-9][0-9]{0,28})\.[0-9]{1,9}|[1-9][0-9]{18,28})")
+_float = re.compile(r"[+-]?(?:0|[1-9][0-9]*)(?:\.[0-9]+)?(?:[eE][+-]?[0-9]+)?")
+_date = re.compile(r"[0-9]{4}-(?:0[1-9]|1[0-2])-(?:0[1-9]|[12][0-9]|3[01])")
+_timestamp = re.compile(r"[0-9]{4}-(?:0[1-9]|1[0-2])-(?:0[1-9]|[12][0-9]|3[01])[T ](?:[01][0-9]|2[0-3]):[0-5][0-9]"
+                        r":[0-5][0-9](?:\.[0-9]{1,9})?(?:Z|[+-][0-9]{2}(?::?[0-9]{2})?| ?UTC)?")
+_booleans = frozenset(("true", "false", "True", "False", "TRUE", "FALSE"))
+_number_first_characters = frozenset("0123456789+-")
+_boolean_first_characters = frozenset("tTfF")
+_int64_min = -(1 << 63)
+_int64_max = (1 << 63) - 1
+_numeric_max = 10 ** 29 - 1
+
+
+def _is_valid_date(value: str) -> bool:
+    """Whether the YYYY-MM-DD date at the start of value exists (the patterns accept e.g. 2020-02-31)"""
+    try:
+        datetime.date(int(value[:4]), int(value[5:7]), int(value[8:10]))
+    except ValueError:
+        return False
+    return True
+
+
+def classify_integer(value: int) -> str:
+    """Big Query type of a python int: INTEGER if it fits in 64 bits, NUMERIC within its precision, FLOAT beyond"""
+    if _int64_min <= value <= _int64_max:
+        return "INTEGER"
+    return "NUMERIC" if -_numeric_max <= value <= _numeric_max else "FLOAT"
+
+
+def classify_string(value: str) -> str:
+    """Big Query type of the data held in a string, one of classified_types.
+    Most strings are rejected by their length or first character alone, and only the patterns that can match
+    the string's shape are tried, so that classifying free text costs a couple of comparisons"""
+    if not 0 < len(value) <= MAX_CLASSIFIED_LENGTH:
+        return "STRING"
+    first = value[0]
+    if first in _number_first_characters:
+        if value[4:5] == "-":
+            if len(value) == 10:
+                return "DATE" if _date.fullmatch(value) and _is_valid_date(value) else "STRING"
+            return "TIMESTAMP" if _timestamp.fullmatch(value) and _is_valid_date(value) else "STRING"
+        if _integer.fullmatch(value):
+            return "INTEGER"
+        if _numeric.fullmatch(value):
+            return "NUMERIC"
+        return "FLOAT" if _float.fullmatch(value) else "STRING"
+    if first in _boolean_first_characters and value in _booleans:
+        return "BOOLEAN"
+    return "STRING"
@@ -0,0 +1,140 @@
+import argparse
+import glob
+import itertools
+import json
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from typing import Dict, List, Tuple
+from .readers import file_formats, iter_file
+from .schema_generator import SchemaGenerator
+
+
+def _infer_file(path: str, file_format: str, generator_options: Dict, max_rows: int = None,
+                csv_options: Dict = None) -> Tuple[str, int, bytes, float]:
+    """Infers the schema of a single file, returning its path, the number of rows read, the generator's state
+    and the time it took"""
+    start = time.perf_counter()
+    records = iter_file(path, file_format, **(csv_options or {}))
+    if max_rows is not None:
+        records = itertools.islice(records, max_rows)
+    schema_generator = SchemaGenerator(**generator_options)
+    schema_generator.update_schema_columns(records)
+    return path, schema_generator.inference_info().rows_seen, schema_generator.dump_state(), \
+        time.perf_counter() - start
+
+
+def _parse_default_types(values: List[str]) -> Dict[str, str]:
+    """Parses NAME=TYPE pairs, each value holding one or more comma separated pairs"""
+    default_types = {}
+    for value in values:
+        for pair in value.split(","):
+            name, separator, column_type = pair.partition("=")
+            if not separator or not name or not column_type:
+                raise argparse.ArgumentTypeError(f"expected NAME=TYPE, got: {pair}")
+            default_types[name.strip()] = column_type.strip().upper()
+    return default_types
+
+
+def _expand_paths(patterns: List[str]) -> List[str]:
+    """Paths matching the glob patterns, in order and without duplicates.
+    Raises argparse.ArgumentTypeError for a path that is not a file, or a glob pattern matching no file"""
+    paths = []
+    for pattern in patterns:
+        if any(character in pattern for character in "*?["):
+            matches = [path for path in sorted(glob.glob(pattern, recursive=True)) if os.path.isfile(path)]
+            if len(matches) == 0:
+                raise argparse.ArgumentTypeError(f"no files match {pattern}")
+        elif os.path.isfile(pattern):
+            matches = [pattern]
+        else:
+            raise argparse.ArgumentTypeError(f"no such file: {pattern}")
+        paths.extend(path for path in matches if path not in paths)
+    return paths
+
+
+def _report_progress(quiet: bool, done: int, total: int, path: str, rows: int, seconds: float, total_rows: int,
+                     start: float) -> None:
+    if quiet:
+        return
+    elapsed = time.perf_counter() - start
+    print(f"[{done}/{total}] {path}: {rows} rows in {seconds:.2f}s ({rows / max(seconds, 1e-9):.0f} rows/s), "
+          f"total {total_rows} rows at {total_rows / max(elapsed, 1e-9):.0f} rows/s", file=sys.stderr)
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(
+        prog="bq-schema-generator",
+        description="Generates the Big Query schema of newline-delimited JSON or CSV files (optionally gzip "
+                    "compressed) and writes it to stdout as JSON. Files are processed in parallel, one per worker.")
+    parser.add_argument("paths", nargs="+", metavar="PATH", help="files or glob patterns, e.g. 'exports/**/*.json.gz'")
+    parser.add_argument("--format", choices=file_formats, default="auto", dest="file_format",
+                        help="format of the files, told from their extension by default (.csv or else NDJSON)")
+    parser.add_argument("--workers", type=int, default=1, help="number of files processed in parallel")
+    parser.add_argument("--sample", type=float, default=None, metavar="RATE",
+                        help="only inspect this fraction of the rows, picked at random")
+    parser.add_argument("--max-rows", type=int, default=None, help="stop reading each file after this many rows")
+    parser.add_argument("--stop-after-unchanged", type=int, default=None, metavar="ROWS",
+                        help="stop reading a file once this many consecutive rows did not change its schema")
+    parser.add_argument("--default-types", action="append", default=[], metavar="NAME=TYPE[,NAME=TYPE...]",
+                        help="types of top level columns, overriding the inferred ones")
+    parser.add_argument("--detect-types", action="store_true",
+                        help="detect INTEGER, NUMERIC, DATE, TIMESTAMP and BOOLEAN values, including in strings")
+    parser.add_argument("--csv-delimiter", default=",", help="delimiter of CSV files")
+    parser.add_argument("--indent", type=int, default=2, help="indentation of the JSON schema")
+    parser.add_argument("--quiet", action="store_true", help="do not report progress on stderr")
+    return parser
+
+
+def main(argv: List[str] = None) -> int:
+    parser = build_parser()
+    args = parser.parse_args(argv)
+    try:
+        default_column_types = _parse_default_types(args.default_types)
+    except argparse.ArgumentTypeError as e:
+        parser.error(str(e))
+    if args.sample is not None and not 0 < args.sample <= 1:
+        parser.error(f"--sample should be in ]0, 1], got {args.sample}")
+    try:
+        paths = _expand_paths(args.paths)
+    except argparse.ArgumentTypeError as e:
+        parser.error(str(e))
+
+    generator_options = {"stop_after_unchanged": args.stop_after_unchanged, "detect_types": args.detect_types}
+    if args.sample is not None:
+        generator_options.update(record_sampling="bernoulli", record_sample_rate=args.sample)
+    file_arguments = [(path, args.file_format, generator_options, args.max_rows, {"delimiter": args.csv_delimiter})
+                      for path in paths]
+
+    # files are merged in order once all of them are done, so that columns are ordered the same way whichever
+    # worker finishes first
+    states = [None] * len(paths)
+    start = time.perf_counter()
+    total_rows = 0
+    try:
+        if args.workers > 1:
+            with ProcessPoolExecutor(max_workers=args.workers) as executor:
+                futures = {executor.submit(_infer_file, *arguments): index
+                           for index, arguments in enumerate(file_arguments)}
+                for done, future in enumerate(as_completed(futures), 1):
+                    path, rows, states[futures[future]], seconds = future.result()
+                    total_rows += rows
+                    _report_progress(args.quiet, done, len(paths), path, rows, seconds, total_rows, start)
+        else:
+            for done, arguments in enumerate(file_arguments, 1):
+                path, rows, states[done - 1], seconds = _infer_file(*arguments)
+                total_rows += rows
+                _report_progress(args.quiet, done, len(paths), path, rows, seconds, total_rows, start)
+    except Exception as e:
+        print(f"bq-schema-generator: error: {e}", file=sys.stderr)
+        return 1
+
+    schema_generator = SchemaGenerator(default_column_types, detect_types=args.detect_types)
+    for state in states:
+        file_generator = SchemaGenerator(detect_types=args.detect_types)
+        file_generator.load_state(state)
+        schema_generator.merge(file_generator)
+    json.dump(schema_generator.get_bq_schema(), sys.stdout, indent=args.indent)
+    sys.stdout.write("\n")
+    return 0
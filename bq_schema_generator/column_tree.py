@@ -0,0 +1,132 @@
+import sys
+from typing import Dict, Iterator, List, Tuple
+from .type_lattice import TypeLattice
+
+# Big Query modes, each mode code being the join of itself and any lower code
+# i.e. a REQUIRED column seen NULLABLE becomes NULLABLE, and a column seen with a list becomes REPEATED
+mode_names = ("REQUIRED", "NULLABLE", "REPEATED")
+mode_codes = {name: code for code, name in enumerate(mode_names)}
+
+# standard SQL names of Big Query types, as they may appear in an existing table's schema
+bq_type_aliases = {
+    "BOOL": "BOOLEAN",
+    "FLOAT64": "FLOAT",
+    "INT64": "INTEGER",
+    "STRUCT": "RECORD",
+}
+
+
+class ColumnNode(object):
+    """A single column of the schema being generated.
+    `name` is the column's (interned) name, `type_code` the code of its type in the generator's TypeLattice and
+    `mode_code` the code of its mode in mode_names, both None until the column has been typed.
+    `children` maps the names of its nested columns to their own nodes, in order of first appearance.
+    Columns are updated in place, and only converted to Big Query schema dicts when the schema is constructed.
+    Field names are kept whole, so a key containing a '.' never collides with a nested path.
+    A column is `saturated` once no scalar value can change its schema anymore, and `unsaturated_children`
+    counts its children that are not.
+    `output` caches the column's Big Query schema field (None if it is omitted from the schema), and is rebuilt only
+    when the column is `dirty`, i.e. when it or one of its nested columns changed since the field was built.
+    Ancestors of a dirty column are always dirty.
+    The top level columns are the children of a root node without name or type.
+    """
+
+    __slots__ = ("parent", "name", "type_code", "mode_code", "saturated", "unsaturated_children", "dirty", "output",
+                 "children")
+
+    def __init__(self, parent: "ColumnNode" = None, name: str = None):
+        self.parent = parent
+        self.name = name
+        self.type_code = None
+        self.mode_code = None
+        self.saturated = False
+        self.unsaturated_children = 0
+        self.dirty = False
+        self.output = None
+        self.children = {}
+
+
+def mark_dirty(node: ColumnNode) -> None:
+    """Marks node and its ancestors as changed, stopping at the first one already marked"""
+    while node is not None and not node.dirty:
+        node.dirty = True
+        node = node.parent
+
+
+def add_column_node(parent: ColumnNode, name: str) -> ColumnNode:
+    """Creates an untyped column named name nested in parent.
+    Names are interned, so that columns sharing a name across records, tables or nesting levels share its string"""
+    name = sys.intern(name)
+    node = parent.children[name] = ColumnNode(parent, name)
+    parent.unsaturated_children += 1
+    return node
+
+
+def get_column_node(root: ColumnNode, path: Tuple[str, ...]) -> ColumnNode:
+    """Returns the node found at path (e.g. ('k_1', 'kk_1')) below root,
+    creating any missing nodes along the way"""
+    node = root
+    for name in path:
+        child = node.children.get(name)
+        node = child if child is not None else add_column_node(node, name)
+    return node
+
+
+def iter_columns(root: ColumnNode) -> Iterator[Tuple[Tuple[str, ...], ColumnNode]]:
+    """Yields a (path, node) tuple for every node below root, parents before their children"""
+    stack = [((name,), node) for name, node in reversed(root.children.items())]
+    while stack:
+        path, node = stack.pop()
+        yield path, node
+        stack.extend((path + (name,), child) for name, child in reversed(node.children.items()))
+
+
+def build_column_tree(schema_columns_dict: Dict[str, Dict], type_lattice: TypeLattice) -> ColumnNode:
+    """Builds a column tree from a schema_columns_dict keyed by '.' separated column names,
+    e.g. {'k_1': {...}, 'k_1.kk_1': {...}}, and returns its root, types being coded in type_lattice.
+    Nested columns are ordered the way their names appear in schema_columns_dict, even if they appear before
+    their parent's, which is why columns are added one nesting level at a time."""
+    levels = {}
+    for name, schema in schema_columns_dict.items():
+        path = tuple(name.split("."))
+        levels.setdefault(len(path), []).append((path, schema))
+
+    root = ColumnNode()
+    for level in sorted(levels):
+        for path, schema in levels[level]:
+            node = get_column_node(root, path)
+            node.type_code = type_lattice.code(schema["type"])
+            node.mode_code = mode_codes[schema["mode"]]
+            mark_dirty(node)
+    return root
+
+
+def column_schema(node: ColumnNode, type_names: List[str]) -> Dict:
+    """Returns the {"mode", "type", "name"} dict of a typed column, type_names mapping type codes to their names"""
+    return {"mode": mode_names[node.mode_code], "type": type_names[node.type_code], "name": node.name}
+
+
+def build_column_tree_from_fields(fields: List[Dict], type_lattice: TypeLattice) -> ColumnNode:
+    """Builds a column tree from a Big Query schema, i.e. a list of fields with nested "fields" lists for
+    RECORD columns, and returns its root, types being coded in type_lattice.
+    Fields without a mode are NULLABLE, as in the Big Query API, and standard SQL type names are mapped to
+    their legacy names (see bq_type_aliases)"""
+    root = ColumnNode()
+    stack = [(root, fields)]
+    while stack:
+        parent, nested_fields = stack.pop()
+        for field in nested_fields:
+            node = add_column_node(parent, field["name"])
+            node.type_code = type_lattice.code(bq_type_aliases.get(field["type"], field["type"]))
+            node.mode_code = mode_codes[field.get("mode") or "NULLABLE"]
+            mark_dirty(node)
+            if field.get("fields"):
+                stack.append((node, field["fields"]))
+    return root
+
+
+def columns_dict_view(root: ColumnNode, type_names: List[str]) -> Dict[str, Dict]:
+    """Returns a copy of the column tree below root as a schema_columns_dict keyed by '.' separated column names,
+    the format used before the column tree was introduced"""
+    return {".".join(path): column_schema(node, type_names)
+            for path, node in iter_columns(root) if node.type_code is not None}
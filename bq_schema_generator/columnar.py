@@ -0,0 +1,148 @@
+import array
+from typing import Any, Dict, Iterable, Iterator, List, Tuple, Union
+
+# Big Query types of numpy dtype kinds (also used by pandas), None meaning the values have to be inspected
+# dates and times are typed as STRING, which is what their ISO formatted values would be typed as
+numpy_kinds = {
+    "b": "BOOLEAN",
+    "i": "FLOAT",
+    "u": "FLOAT",
+    "f": "FLOAT",
+    "U": "STRING",
+    "S": "STRING",
+    "M": "STRING",
+    "m": "STRING",
+    "O": None,
+}
+
+# Big Query types of numpy dtype kinds when types are detected
+detected_numpy_kinds = dict(numpy_kinds, i="INTEGER", u="INTEGER", M="TIMESTAMP")
+
+# Big Query types of arrow data types, by prefix of their name (e.g. "int64", "timestamp[us]")
+arrow_types = (
+    ("bool", "BOOLEAN"),
+    ("int", "FLOAT"),
+    ("uint", "FLOAT"),
+    ("halffloat", "FLOAT"),
+    ("float", "FLOAT"),
+    ("double", "FLOAT"),
+    ("decimal", "FLOAT"),
+    ("string", "STRING"),
+    ("large_string", "STRING"),
+    ("timestamp", "STRING"),
+    ("date", "STRING"),
+    ("time", "STRING"),
+)
+
+# Big Query types of arrow data types when types are detected
+detected_arrow_types = (
+    ("bool", "BOOLEAN"),
+    ("int", "INTEGER"),
+    ("uint", "INTEGER"),
+    ("halffloat", "FLOAT"),
+    ("float", "FLOAT"),
+    ("double", "FLOAT"),
+    ("decimal", "NUMERIC"),
+    ("string", "STRING"),
+    ("large_string", "STRING"),
+    ("timestamp", "TIMESTAMP"),
+    ("date", "DATE"),
+    ("time", "STRING"),
+)
+
+# arrow data types of binary data, which the Big Query types of the TypeLattice cannot hold
+unsupported_arrow_types = ("binary", "large_binary", "fixed_size_binary")
+
+# array.array typecodes, which are all numeric apart from unicode characters
+array_typecodes = {typecode: "FLOAT" for typecode in array.typecodes}
+array_typecodes["u"] = "STRING"
+
+# array.array typecodes when types are detected, all but floating point ones being integers
+detected_array_typecodes = {typecode: ("FLOAT" if typecode in "fd" else "INTEGER") for typecode in array.typecodes}
+detected_array_typecodes["u"] = "STRING"
+
+
+def _numpy_column(values: Any, kinds: Dict[str, Union[str, None]]) -> Tuple[Union[str, None], Any]:
+    """Types a numpy array or pandas Series from its dtype, without looking at its values
+    unless it holds python objects, or to check whether all of them are missing"""
+    column_type = kinds.get(values.dtype.kind)
+    if column_type is None:
+        if hasattr(values, "isna") and values.isna().any():
+            # pandas' missing values (NaN, NaT, and pd.NA of nullable dtypes) are returned as None
+            values = values.astype(object).where(values.notna(), None)
+        return None, values
+    if len(values) == 0:
+        all_missing = True
+    elif hasattr(values, "isna"):
+        all_missing = values.isna().all()
+    else:
+        # NaN and NaT are the only values not equal to themselves
+        all_missing = values.dtype.kind in "fMm" and (values != values).all()
+    return ("NULL" if all_missing else column_type), None
+
+
+def _arrow_column(name: str, column: Any, types: Tuple[Tuple[str, str], ...]) -> Tuple[Union[str, None], Any]:
+    """Types a pyarrow (Chunked)Array from its data type, without looking at its values
+    unless it holds nested data"""
+    type_name = str(column.type)
+    if type_name.startswith(unsupported_arrow_types):
+        raise Exception(f"Unsupported arrow datatype: {type_name}, for column: {name}")
+    if column.null_count == len(column):
+        return "NULL", None
+    for prefix, column_type in types:
+        if type_name.startswith(prefix):
+            return column_type, None
+    return None, column.to_pylist()
+
+
+def iter_table_columns(table: Any, detect_types: bool = False) -> Iterator[Tuple[str, Union[str, None], Any]]:
+    """Yields a (name, type, values) tuple for every column of table, which can be a pyarrow Table, a pandas
+    DataFrame or a mapping of column names to numpy arrays, array.arrays or sequences of python values.
+    type is the column's Big Query type when it can be told from the column's data type ("NULL" if all of its values
+    are missing), values being None then. Otherwise type is None and values have to be inspected one by one.
+    With detect_types, integer, date and time data types are typed as INTEGER, DATE and TIMESTAMP.
+    Arrow binary columns, and columns whose names are not strings (e.g. the default labels of a DataFrame), raise an
+    exception.
+    """
+    kinds, types, typecodes = (detected_numpy_kinds, detected_arrow_types, detected_array_typecodes) if detect_types \
+        else (numpy_kinds, arrow_types, array_typecodes)
+    if hasattr(table, "column_names") and hasattr(table, "column"):  # pyarrow Table or RecordBatch
+        for name in table.column_names:
+            yield (name, *_arrow_column(name, table.column(name), types))
+        return
+
+    for name, values in table.items():
+        if type(name) is not str:
+            raise Exception(f"Column names should be strings, got: {name!r}")
+        if hasattr(values, "dtype"):
+            yield (name, *_numpy_column(values, kinds))
+        elif isinstance(values, array.array):
+            yield name, ("NULL" if len(values) == 0 else typecodes[values.typecode]), None
+        else:
+            yield name, None, values
+
+
+def _has_missing_values(values: Any) -> bool:
+    """Whether a column holds None, NaN or NaT values"""
+    if hasattr(values, "null_count"):  # pyarrow (Chunked)Array
+        return values.null_count > 0
+    if hasattr(values, "isna"):
+        return bool(values.isna().any())
+    if hasattr(values, "dtype") and values.dtype.kind != "O":
+        # NaN and NaT are the only values not equal to themselves
+        return values.dtype.kind in "fMm" and bool((values != values).any())
+    if isinstance(values, array.array):
+        return False
+    return any(value is None or (type(value) is float and value != value) for value in values)
+
+
+def columns_with_missing_values(table: Any, names: Iterable[str]) -> List[str]:
+    """Names of the columns in names that table (as accepted by iter_table_columns) lacks or that hold missing
+    values, a table without rows having none"""
+    if hasattr(table, "column_names") and hasattr(table, "column"):  # pyarrow Table or RecordBatch
+        columns = {name: table.column(name) for name in table.column_names}
+    else:
+        columns = dict(table.items())
+    if not columns or all(len(values) == 0 for values in columns.values()):
+        return []
+    return [name for name in names if name not in columns or _has_missing_values(columns[name])]
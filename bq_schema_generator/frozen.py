@@ -0,0 +1,29 @@
+from typing import NoReturn
+
+
+class FrozenDict(dict):
+    """A dict that cannot be modified once created. It still compares equal to, and serializes like, a plain dict.
+    copy() returns a regular (mutable) dict"""
+
+    def _immutable(self, *args, **kwargs) -> NoReturn:
+        raise TypeError(f"'{type(self).__name__}' object is immutable")
+
+    __setitem__ = __delitem__ = __ior__ = _immutable
+    clear = pop = popitem = setdefault = update = _immutable
+
+    def __reduce__(self):
+        return type(self), (dict(self),)
+
+
+class FrozenList(list):
+    """A list that cannot be modified once created. It still compares equal to, and serializes like, a plain list.
+    copy() returns a regular (mutable) list"""
+
+    def _immutable(self, *args, **kwargs) -> NoReturn:
+        raise TypeError(f"'{type(self).__name__}' object is immutable")
+
+    __setitem__ = __delitem__ = __iadd__ = __imul__ = _immutable
+    append = extend = insert = remove = pop = clear = sort = reverse = _immutable
+
+    def __reduce__(self):
+        return type(self), (list(self),)
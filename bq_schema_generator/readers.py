@@ -0,0 +1,173 @@
+import csv
+import gzip
+import io
+import json
+import mmap
+import os
+from typing import BinaryIO, Dict, Iterator, Union
+
+DEFAULT_CHUNK_SIZE = 1 << 20
+GZIP_MAGIC = b"\x1f\x8b"
+
+Source = Union[str, os.PathLike, BinaryIO]
+# formats of the files read by iter_file, "auto" telling them from their extension
+file_formats = ("auto", "ndjson", "csv")
+
+
+def _open_source(source: Source, use_mmap: bool = False) -> BinaryIO:
+    """Opens a path (or wraps an already opened binary file object) for reading,
+    transparently decompressing gzip inputs and memory-mapping plain files if use_mmap is set"""
+    if isinstance(source, (str, os.PathLike)):
+        with open(source, "rb") as fileobj:
+            magic = fileobj.read(2)
+        if magic == GZIP_MAGIC:
+            return gzip.open(source, "rb")
+        fileobj = open(source, "rb")
+        if use_mmap and os.fstat(fileobj.fileno()).st_size > 0:
+            mapped = mmap.mmap(fileobj.fileno(), 0, access=mmap.ACCESS_READ)
+            fileobj.close()
+            return _MmapReader(mapped)
+        return fileobj
+
+    if hasattr(source, "peek"):
+        magic = source.peek(2)[:2]
+    elif source.seekable():
+        position = source.tell()
+        magic = source.read(2)
+        source.seek(position)
+    elif isinstance(source, io.RawIOBase):
+        # buffer unseekable raw streams (e.g. pipes and sockets) so that their first bytes can be peeked at
+        source = io.BufferedReader(source)
+        magic = source.peek(2)[:2]
+    else:
+        magic = b""
+    if magic == GZIP_MAGIC:
+        return gzip.GzipFile(fileobj=source)
+    return source
+
+
+def _iter_lines(fileobj: BinaryIO, chunk_size: int) -> Iterator[bytes]:
+    """Reads fileobj chunk_size bytes at a time, yielding the complete lines of each chunk as one block"""
+    tail = b""
+    while True:
+        chunk = fileobj.read(chunk_size)
+        if not chunk:
+            break
+        if isinstance(chunk, str):
+            chunk = chunk.encode("utf-8")
+        end = chunk.rfind(b"\n")
+        if end == -1:
+            tail += chunk
+            continue
+        yield tail + chunk[:end]
+        tail = chunk[end + 1:]
+    if tail.strip():
+        yield tail
+
+
+def _skeletonize(block: bytes, max_kept_length: int = 0) -> bytes:
+    """Empties every string value of a block of JSON text longer than max_kept_length bytes, keeping keys and
+    everything else as is, e.g. b'{"k_1": "some long text", "k_2": 1}' becomes b'{"k_1": "", "k_2": 1}'.
+    Splitting on '"' runs at memchr speed, and the emptied block is much cheaper to decode when string values
+    dominate the input. Only blocks without escaped quotes can be split this way, others are returned as is.
+    """
+    if b'\\"' in block:
+        return block
+    parts = block.split(b'"')
+    # odd parts are the contents of strings, each followed by the JSON text up to the next string,
+    # which starts with a ':' for keys
+    parts[1::2] = [string if len(string) <= max_kept_length or text.lstrip()[:1] == b":" else b""
+                   for string, text in zip(parts[1::2], parts[2::2])]
+    return b'"'.join(parts)
+
+
+def _decode_lines(block: bytes, schema_only: bool = False, max_kept_length: int = 0) -> list:
+    """Decodes a block of newline-delimited JSON records with a single json.loads call,
+    falling back to one call per line to point at the offending line if the block does not decode, or does not
+    decode into one value per line (e.g. a line holding '{"k_1": 1}, {"k_2": 2}').
+    With schema_only, string values longer than max_kept_length are decoded as empty strings (see _skeletonize)"""
+    if schema_only:
+        block = _skeletonize(block, max_kept_length)
+    lines = [line for line in block.split(b"\n") if line.strip()]
+    try:
+        records = json.loads(b"[" + b",".join(lines) + b"]")
+        if len(records) == len(lines):
+            return records
+    except json.JSONDecodeError:
+        pass
+    return [json.loads(line) for line in lines]
+
+
+def iter_ndjson(source: Source, chunk_size: int = DEFAULT_CHUNK_SIZE, use_mmap: bool = False,
+                schema_only: bool = False, max_kept_length: int = 0) -> Iterator[Dict]:
+    """Streams the records of a newline-delimited JSON file (or gzip compressed file), keeping at most about
+    chunk_size bytes of the input in memory at a time.
+    With schema_only, string values are not decoded and come out as empty strings, which is all
+    schema inference needs to know about them, unless they are at most max_kept_length bytes long
+    (e.g. to detect the type of short strings)"""
+    fileobj = _open_source(source, use_mmap)
+    try:
+        for block in _iter_lines(fileobj, chunk_size):
+            yield from _decode_lines(block, schema_only, max_kept_length)
+    finally:
+        if fileobj is not source:
+            fileobj.close()
+
+
+def iter_csv(source: Source, chunk_size: int = DEFAULT_CHUNK_SIZE, use_mmap: bool = False,
+             encoding: str = "utf-8", **reader_kwargs) -> Iterator[Dict]:
+    """Streams the rows of a CSV file (or gzip compressed file) with a header line as dictionaries,
+    reading chunk_size bytes at a time. Empty cells are returned as None, like missing values in JSON.
+    reader_kwargs are passed on to csv.DictReader"""
+    fileobj = _open_source(source, use_mmap)
+    text = None
+    try:
+        if isinstance(fileobj, io.TextIOBase):
+            rows = csv.DictReader(fileobj, **reader_kwargs)
+        else:
+            text = io.TextIOWrapper(io.BufferedReader(fileobj, buffer_size=chunk_size), encoding=encoding, newline="")
+            rows = csv.DictReader(text, **reader_kwargs)
+        for row in rows:
+            yield {key: (value if value != "" else None) for key, value in row.items()}
+    finally:
+        # detach the wrappers so that a file object passed in by the caller is left open
+        if text is not None:
+            text.detach().detach()
+        if fileobj is not source:
+            fileobj.close()
+
+
+def _file_format(path: Union[str, os.PathLike], file_format: str) -> str:
+    """Format of a file, told from its extension (ignoring a .gz one) unless given explicitly"""
+    if file_format != "auto":
+        return file_format
+    path = os.fspath(path)
+    name = path[:-len(".gz")] if path.endswith(".gz") else path
+    return "csv" if name.lower().endswith(".csv") else "ndjson"
+
+
+def iter_file(path: Union[str, os.PathLike], file_format: str = "auto", **csv_kwargs) -> Iterator[Dict]:
+    """Streams the records of a newline-delimited JSON or CSV file (optionally gzip compressed), file_format being
+    one of file_formats. csv_kwargs are passed on to iter_csv"""
+    if _file_format(path, file_format) == "csv":
+        return iter_csv(path, **csv_kwargs)
+    return iter_ndjson(path)
+
+
+class _MmapReader(io.RawIOBase):
+    """Minimal raw stream over a memory-mapped file, so it can be buffered and decoded like a regular file"""
+
+    def __init__(self, mapped: mmap.mmap):
+        self._mapped = mapped
+
+    def readable(self) -> bool:
+        return True
+
+    def readinto(self, buffer) -> int:
+        data = self._mapped.read(len(buffer))
+        buffer[:len(data)] = data
+        return len(data)
+
+    def close(self) -> None:
+        self._mapped.close()
+        super().close()
@@ -1,6 +1,19 @@
 
-from typing import List, Dict, Union
-from .utils import get_dict_value
+from collections import OrderedDict, namedtuple
+import asyncio
+import random
+import time
+from typing import AsyncIterable, Iterable, Iterator, List, Dict, Tuple, Union
+from .column_tree import ColumnNode, add_column_node, build_column_tree, build_column_tree_from_fields, \
+    bq_type_aliases, columns_dict_view, get_column_node, iter_columns, mark_dirty, mode_codes, mode_names
+from .frozen import FrozenDict, FrozenList
+from .type_lattice import TypeLattice
+from .classifiers import MAX_CLASSIFIED_LENGTH, classified_types, classify_integer, classify_string, \
+    detected_python_types, detected_type_hierarchy
+from .columnar import columns_with_missing_values, iter_table_columns
+from .state import dump_column_tree, load_column_tree
+from .readers import DEFAULT_CHUNK_SIZE, Source, iter_csv, iter_ndjson
+from .stats import SchemaStats
 import logging
 
 type_ = {
@@ -13,6 +26,31 @@ type_ = {
     type(None): "NULL"
 }
 
+# python types whose values can never turn a column into a RECORD
+scalar_types = frozenset((bool, float, int, str, type(None)))
+
+# how the elements of lists are inspected: all of them, the first array_sample_size ones,
+# or array_sample_size ones picked uniformly at random
+array_sampling_modes = ("full", "first", "reservoir")
+
+# which records are inspected: all of them, each one with probability record_sample_rate,
+# or record_sample_size ones picked uniformly at random from all the records seen
+record_sampling_modes = ("full", "bernoulli", "reservoir")
+
+# what happens to dicts and lists of dicts nested deeper than max_depth RECORDs: raise an exception, ignore them,
+# or type them as STRING columns (as if they had been serialized to JSON strings)
+max_depth_policies = ("raise", "ignore", "stringify")
+
+required_mode = mode_codes["REQUIRED"]
+nullable_mode = mode_codes["NULLABLE"]
+repeated_mode = mode_codes["REPEATED"]
+
+ShapeCacheInfo = namedtuple("ShapeCacheInfo", ["hits", "misses", "maxsize", "currsize"])
+InferenceInfo = namedtuple("InferenceInfo", ["rows_seen", "rows_examined", "converged"])
+# a difference between the seeded schema and the records, change being "added", "type" or "mode".
+# old and new are type names for "added" (old being None) and "type" changes, mode names for "mode" changes
+SchemaChange = namedtuple("SchemaChange", ["name", "change", "old", "new", "applied"])
+
 # left side is loose, right side is precise/correct
 # i.e. right side can overwrite left side
 type_hierarchy = {
@@ -29,23 +67,372 @@ class SchemaGenerator(object):
     Also, internally uses a precision based hierarchy to determine
     which datatype to use (instead of using the last known value).
     As with previous version, omits empty lists or structs.
-    Legacy issue: all numbers are cast as float.
+    Legacy issue: all numbers are cast as float, unless types are detected.
+    With detect_types, python ints are typed as INTEGER (and datetimes, dates and Decimals as TIMESTAMP, DATE and
+    NUMERIC), and strings holding integers, decimals, dates, timestamps or booleans are typed accordingly
+    (see classifiers.py), using detected_type_hierarchy in place of type_hierarchy.
+    A TypeLattice with custom widening rules can be passed in place of the default type_hierarchy.
+    Columns that no scalar value can widen anymore (e.g. STRING) are saturated, and are skipped
+    without being re-typed, as are nested records made only of known saturated columns.
+    With a shape_cache_size, the scalar fields of records whose keys and value types were already seen are
+    skipped (see _get_record_schema).
+    Every element of a list is inspected by default, a list taking the join of its elements' types. Huge lists can
+    instead be sampled with array_sampling="first" or "reservoir" (see array_sampling_modes).
+    With collect_stats, counters and phase timings are collected in self.stats (see SchemaStats).
+    Records can also be sampled (see record_sampling_modes), and with stop_after_unchanged the generator converges,
+    ignoring any further records, once that many consecutive records were examined without any column appearing or
+    changing. inference_info() tells how many records were seen and examined. Exhaustive inference is the default.
+    A generator can be seeded with an existing Big Query schema (see seed_bq_schema), and then only applies the
+    changes Big Query allows to it, reporting the others in schema_diff().
+    Records are walked iteratively, so nesting is not limited by the recursion limit, but can be limited to
+    max_depth levels of nested RECORDs (Big Query allows 15), deeper values being handled according to
+    max_depth_policy.
     """
 
     def __init__(self,
-                 default_column_types: Dict = None):
-        self.schema_columns_dict = {}
+                 default_column_types: Dict = None,
+                 type_lattice: TypeLattice = None,
+                 shape_cache_size: int = 0,
+                 array_sampling: str = "full",
+                 array_sample_size: int = 1000,
+                 array_sample_seed: int = None,
+                 collect_stats: bool = False,
+                 record_sampling: str = "full",
+                 record_sample_rate: float = 1.0,
+                 record_sample_size: int = 10000,
+                 record_sample_seed: int = None,
+                 stop_after_unchanged: int = None,
+                 seed_schema: List[Dict] = None,
+                 max_depth: int = None,
+                 max_depth_policy: str = "raise",
+                 detect_types: bool = False):
+        if array_sampling not in array_sampling_modes:
+            raise Exception(f"Unknown array sampling mode: {array_sampling}, expected one of {array_sampling_modes}")
+        if record_sampling not in record_sampling_modes:
+            raise Exception(f"Unknown record sampling mode: {record_sampling}, expected one of {record_sampling_modes}")
+        if not 0 < record_sample_rate <= 1:
+            raise Exception(f"record_sample_rate should be in ]0, 1], got {record_sample_rate}")
+        if max_depth_policy not in max_depth_policies:
+            raise Exception(f"Unknown max depth policy: {max_depth_policy}, expected one of {max_depth_policies}")
+        if max_depth_policy == "stringify" and type_lattice is not None and "STRING" not in type_lattice.codes:
+            raise Exception("max_depth_policy='stringify' needs a TypeLattice holding STRING")
+        if record_sampling == "reservoir" and stop_after_unchanged is not None:
+            raise Exception("stop_after_unchanged cannot be combined with reservoir sampling, "
+                            "whose records are only examined when the schema is requested")
+        self._types = {**type_, **detected_python_types} if detect_types else type_
+        self._classify = classify_string if detect_types else None
+        if type_lattice is None:
+            type_lattice = TypeLattice(detected_type_hierarchy if detect_types else type_hierarchy)
+        self._type_lattice = type_lattice
+        self._record_code = self._type_lattice.code("RECORD")
+        self._saturated = self._saturated_types()
+        self._root = ColumnNode()
+        self._shape_cache = OrderedDict()
+        self._shape_cache_size = shape_cache_size
+        self._shape_cache_hits = 0
+        self._shape_cache_misses = 0
+        self._snapshot = None
+        self._snapshot_default_column_types = None
+        self._array_sampling = array_sampling
+        self._array_sample_size = array_sample_size
+        self._array_random = random.Random(array_sample_seed)
+        self._record_sampling = record_sampling
+        self._record_sample_rate = record_sample_rate
+        self._record_sample_size = record_sample_size
+        self._record_random = random.Random(record_sample_seed)
+        self._reservoir = []
+        self._reservoir_pending = set()
+        self._async_batch = []
+        self._stop_after_unchanged = stop_after_unchanged
+        self._schema_changes = 0
+        self._unchanged_records = 0
+        self._rows_seen = 0
+        self._rows_examined = 0
+        self._seed_columns = {}
+        self._required_columns = {}
+        self._proposed_changes = {}
+        self._max_depth = max_depth
+        self._max_depth_policy = max_depth_policy
         self.bq_consumable_schema = []
         self.default_column_types = default_column_types if default_column_types is not None else {}
+        self.stats = None
+        if collect_stats:
+            self.stats = SchemaStats()
+            self._instrument()
+        if seed_schema is not None:
+            self.seed_bq_schema(seed_schema)
+
+    def _saturated_types(self) -> List[bool]:
+        """Tells for every type code whether no scalar value can widen columns of that type
+        (nor has a type without a common type with it, which a seeded column has to report)"""
+        scalar_type_names = {self._types[t] for t in scalar_types}
+        if self._classify is not None:
+            scalar_type_names.update(classified_types)
+        scalar_codes = [self._type_lattice.codes[name] for name in scalar_type_names
+                        if name in self._type_lattice.codes]
+        join_table = self._type_lattice.join_table
+        return [all(join_table[code][incoming] == code == join_table[incoming][code] for incoming in scalar_codes)
+                for code in range(len(self._type_lattice.names))]
+
+    def _instrument(self) -> None:
+        """Shadows the hot path methods with instance attributes wrapping them to update self.stats.
+        The class methods are left untouched, so generators not collecting stats do not pay for a single check
+        (fields and depth are counted by _update_elements itself, and only added to self.stats once per call)"""
+        stats = self.stats
+        get_record_schema = self._get_record_schema
+        update_column_node = self._update_column_node
+        set_column_schema = self._set_column_schema
+        construct_bq_schema = self._construct_bq_schema
+
+        def timed(phase, method):
+            def wrapper(*args, **kwargs):
+                start = time.perf_counter()
+                try:
+                    return method(*args, **kwargs)
+                finally:
+                    stats.phase_seconds[phase] += time.perf_counter() - start
+                    stats.phase_calls[phase] += 1
+            return wrapper
+
+        def counted_get_record_schema(record):
+            stats.records += 1
+            return get_record_schema(record)
+
+        def counted_update_column_node(node, type_code, mode_code):
+            stats.merges += 1
+            return update_column_node(node, type_code, mode_code)
+
+        def counted_set_column_schema(node, type_code, mode_code):
+            if node.type_code is not None and node.type_code != type_code:
+                stats.widenings += 1
+            return set_column_schema(node, type_code, mode_code)
+
+        self._get_record_schema = timed("get_record_schema", counted_get_record_schema)
+        self._update_column_node = timed("update_schema_columns_dict", counted_update_column_node)
+        self._set_column_schema = counted_set_column_schema
+        self._construct_bq_schema = timed("construct_bq_schema", construct_bq_schema)
+
+    @property
+    def schema_columns_dict(self) -> Dict:
+        """Dotted-name view of the column tree, e.g. {'k_1': {...}, 'k_1.kk_1': {...}}
+        Kept for backward compatibility, the generator itself only reads and writes the tree below self._root
+        """
+        self._merge_reservoir()
+        return columns_dict_view(self._root, self._type_lattice.names)
+
+    @schema_columns_dict.setter
+    def schema_columns_dict(self, schema_columns_dict: Dict) -> None:
+        self._set_column_tree(build_column_tree(schema_columns_dict, self._type_lattice))
+
+    def _set_column_tree(self, root: ColumnNode) -> None:
+        """Replaces the column tree with the one below root, whose nodes only have their type and mode codes set"""
+        self._root = root
+        self._shape_cache.clear()
+        self._snapshot = None
+        self._seed_columns = {}
+        self._required_columns = {}
+        self._proposed_changes = {}
+        for _, node in iter_columns(self._root):
+            if node.type_code is not None:
+                self._set_column_schema(node, node.type_code, node.mode_code)
+
+    def seed_bq_schema(self, bq_schema: List[Dict]) -> None:
+        """Replaces the generator's columns with those of an existing Big Query schema (e.g. a live table's),
+        in the format returned by get_bq_schema. Records are then merged into it, but only the changes Big Query
+        allows on an existing table are applied: adding columns, and relaxing REQUIRED columns to NULLABLE
+        when a record misses them or holds None. Changes of type or to REPEATED are only reported by schema_diff().
+        Seeding INTEGER, NUMERIC, DATE or TIMESTAMP columns requires detect_types=True, under which they follow
+        Big Query's widening rules (see detected_type_hierarchy), so that values can be checked against them.
+        Types no value is inferred as (e.g. BYTES or TIME) are added to a copy of the TypeLattice, and can only be
+        widened into a STRING or a RECORD. Seeded columns that no scalar can widen (e.g. STRING) are saturated from
+        the start. Only the name, type and mode of the seeded fields are kept."""
+        type_names = set()
+        stack = [bq_schema]
+        while stack:
+            for field in stack.pop():
+                type_names.add(bq_type_aliases.get(field["type"], field["type"]))
+                stack.append(field.get("fields") or [])
+        unknown_type_names = type_names - self._type_lattice.codes.keys()
+        undetected_type_names = unknown_type_names.intersection(classified_types)
+        if undetected_type_names:
+            raise Exception(f"Seeded types {sorted(undetected_type_names)} are not inferred by this generator, "
+                            "which needs detect_types=True (and a TypeLattice holding them)")
+        if unknown_type_names:
+            # the lattice may be shared with other generators
+            self._type_lattice = self._type_lattice.copy()
+        for type_name in sorted(unknown_type_names):
+            self._type_lattice.add_type(type_name)
+            for precise_type in ("STRING", "RECORD"):
+                if precise_type in self._type_lattice.codes:
+                    self._type_lattice.add_widening(type_name, precise_type)
+        self._saturated = self._saturated_types()
+        self._set_column_tree(build_column_tree_from_fields(bq_schema, self._type_lattice))
+        self._set_seed_columns({node: (node.type_code, node.mode_code) for _, node in iter_columns(self._root)
+                                if node.type_code is not None})
+
+    def _set_seed_columns(self, seed_columns: Dict[ColumnNode, Tuple[int, int]],
+                          proposed_changes: Dict[ColumnNode, Tuple[int, int]] = None) -> None:
+        """Records the types and modes the columns of the tree were seeded with, and the changes records proposed
+        to them, keeping track of the seeded columns that are still REQUIRED"""
+        self._seed_columns = seed_columns
+        self._proposed_changes = proposed_changes if proposed_changes is not None else {}
+        self._required_columns = {}
+        for node in seed_columns:
+            if node.mode_code == required_mode:
+                self._required_columns[node.parent] = self._required_columns.get(node.parent, ()) + (node.name,)
+
+    def _relax_required(self, node: ColumnNode, elem_value: Union[dict, list]) -> None:
+        """Relaxes the REQUIRED seeded columns nested in node to NULLABLE if elem_value, the value of node
+        (or a record for the root), lacks them or holds None for them"""
+        elements = elem_value if type(elem_value) is list else (elem_value,)
+        names = self._required_columns[node]
+        missing_names = set()
+        for element in elements:
+            if type(element) is dict:
+                missing_names.update(name for name in names if element.get(name) is None)
+        if missing_names:
+            self._relax_columns(node, missing_names)
+
+    def _relax_columns(self, node: ColumnNode, names: Iterable[str]) -> None:
+        """Relaxes the REQUIRED seeded columns of node named in names to NULLABLE"""
+        for name in names:
+            child = node.children[name]
+            mark_dirty(child)
+            child.mode_code = nullable_mode
+            self._schema_changes += 1
+        required_names = tuple(name for name in self._required_columns[node]
+                               if node.children[name].mode_code == required_mode)
+        if required_names:
+            self._required_columns[node] = required_names
+        else:
+            del self._required_columns[node]
+
+    def _restrict_to_seed(self, node: ColumnNode, type_code: int, mode_code: int) -> Tuple[int, int]:
+        """Type and mode a seeded column can take given the ones records would have it take,
+        recording the changes Big Query would not allow so that schema_diff can report them"""
+        seed_type_code, seed_mode_code = self._seed_columns[node]
+        proposed_type_code, proposed_mode_code = self._proposed_changes.get(node, self._seed_columns[node])
+        if self._type_lattice.comparable(proposed_type_code, type_code):
+            proposed_type_code = self._type_lattice.join_table[proposed_type_code][type_code]
+        else:
+            # no type can hold both, the incoming one is reported instead
+            proposed_type_code = type_code
+        proposed = (proposed_type_code, repeated_mode if mode_code == repeated_mode else proposed_mode_code)
+        if proposed != self._seed_columns[node]:
+            self._proposed_changes[node] = proposed
+        # REQUIRED columns are only relaxed by _relax_required, a record holding them does not make them NULLABLE
+        return seed_type_code, node.mode_code
+
+    def schema_diff(self) -> List[SchemaChange]:
+        """Differences between the seeded schema and the records seen since: added columns (applied), REQUIRED
+        columns relaxed to NULLABLE (applied), and changes of type or to REPEATED (not applied, as Big Query does not
+        allow them on an existing table). Columns nested in a column that is not a RECORD, and columns get_bq_schema
+        leaves out (RECORDs without any fields), are not reported."""
+        # brings the cached fields of the columns up to date
+        self.get_bq_schema()
+        changes = []
+        stack = [((name,), node) for name, node in reversed(self._root.children.items())]
+        while stack:
+            path, node = stack.pop()
+            if node.output is None:
+                continue
+            name = ".".join(path)
+            seed = self._seed_columns.get(node)
+            if seed is None:
+                changes.append(SchemaChange(name, "added", None, self._type_lattice.names[node.type_code], True))
+            else:
+                proposed_type_code, proposed_mode_code = self._proposed_changes.get(node, seed)
+                if proposed_type_code != seed[0]:
+                    changes.append(SchemaChange(name, "type", self._type_lattice.names[seed[0]],
+                                                self._type_lattice.names[proposed_type_code], False))
+                if proposed_mode_code != seed[1]:
+                    changes.append(SchemaChange(name, "mode", mode_names[seed[1]], mode_names[proposed_mode_code],
+                                                False))
+                elif node.mode_code != seed[1]:
+                    changes.append(SchemaChange(name, "mode", mode_names[seed[1]], mode_names[node.mode_code], True))
+            if node.type_code == self._record_code:
+                stack.extend((path + (name,), child) for name, child in reversed(node.children.items()))
+        return changes
+
+    def dump_state(self) -> bytes:
+        """Serializes the generator's columns to a compact, versioned binary format (see state.py),
+        e.g. to checkpoint a long running job or cache the state of a partition"""
+        self._merge_reservoir()
+        return dump_column_tree(self._root, self._type_lattice, self._seed_columns, self._proposed_changes)
+
+    def load_state(self, state: bytes) -> None:
+        """Replaces the generator's columns with a state returned by dump_state, seeded columns included.
+        The state of a seeded generator can only be loaded by one seeded with the same types (e.g. BYTES).
+        To combine a saved state with the current one instead, load it in another generator and merge it"""
+        root, seed_columns, proposed_changes = load_column_tree(state, self._type_lattice)
+        self._set_column_tree(root)
+        self._set_seed_columns(seed_columns, proposed_changes)
+
+    def _sample_list(self, x: list) -> list:
+        """Returns the elements of x to inspect, according to the array sampling mode"""
+        if self._array_sampling == "full" or len(x) <= self._array_sample_size:
+            return x
+        if self._array_sampling == "first":
+            return x[:self._array_sample_size]
+        return self._array_random.sample(x, self._array_sample_size)
+
+    def _get_list_type(self, x: list) -> Union[str, None]:
+        """Joins the types of the (sampled) elements of a non empty list, ignoring None elements unless the list holds
+        nothing else.
+        The distinct element types are collected at C speed by set(map(type, ...)), so a homogeneous list costs
+        a single type lookup whatever its length"""
+        x = self._sample_list(x)
+        element_types = set(map(type, x))
+        homogeneous = len(element_types) == 1
+        if not homogeneous:
+            element_types.discard(type(None))
+        return self._join_value_types(element_types, x, homogeneous)
+
+    def _join_value_types(self, element_types: set, values: list, homogeneous: bool = False) -> Union[str, None]:
+        """Joins the types of values, element_types being the set of their python types (homogeneous telling whether
+        all values are of the single type in it). When types are detected, each distinct string is classified,
+        as are the smallest and largest ints"""
+        if self._classify is None or (str not in element_types and int not in element_types):
+            return self._join_types(element_types)
+        type_names = {self._types[element_type] for element_type in element_types
+                      if element_type is not str and element_type is not int}
+        if str in element_types:
+            type_names.update(map(self._classify, {value for value in values if type(value) is str}))
+        if int in element_types:
+            # the extreme ints are the only ones that may not fit in 64 bits, and are found at C speed
+            integers = values if homogeneous else [value for value in values if type(value) is int]
+            type_names.update((classify_integer(min(integers)), classify_integer(max(integers))))
+        return self._join_type_names(type_names)
+
+    def _join_types(self, element_types: set) -> Union[str, None]:
+        """Joins the types of a set of python types in the TypeLattice"""
+        return self._join_type_names({self._types[element_type] for element_type in element_types})
+
+    def _join_type_names(self, type_names: set) -> Union[str, None]:
+        """Joins a set of type names in the TypeLattice"""
+        if len(type_names) == 1:
+            return next(iter(type_names))
+
+        type_code = None
+        for type_name in type_names:
+            element_type_code = self._type_lattice.codes.get(type_name)
+            if element_type_code is None:
+                return type_name  # unknown datatype, reported when merged
+            type_code = self._type_lattice.join(type_code, element_type_code)
+        return self._type_lattice.names[type_code]
 
     def _get_type(self, x: Union[dict, bool, float, int, str, list, type(None)]) -> Union[str, None]:
         if isinstance(x, list):
             if len(x) > 0:
-                return type_[type(x[0])]
+                return self._get_list_type(x)
             else:
                 return None
+        elif self._classify is not None and type(x) is str:
+            return self._classify(x)
+        elif self._classify is not None and type(x) is int:
+            return classify_integer(x)
         else:
-            return type_[type(x)]
+            return self._types[type(x)]
 
     def _get_mode(self, x: Union[dict, bool, float, int, str, list, type(None)]) -> Union[str, None]:
         if isinstance(x, list):
@@ -61,62 +448,239 @@ class SchemaGenerator(object):
 
     def _get_element_schema(self, elem_key: str, elem_value: Union[dict, bool, float, int, str, list, type(None)],
                             parent_elem_name: str) -> dict:
-        """recursively updates a dictionary by checking an element's value for its mode and type,
-        as well as updating the element's key name by appending it to its parents' with a separator'
+        """Updates the column tree with an element whose parent is named parent_elem_name,
+        where nested names are separated by '.' (e.g. 'k_1.kk_1'), or '' for a top level element
         """
-        # unknown type, ignore field
-        if elem_value is None or elem_value == [] or elem_value == {}:
-            return
+        if parent_elem_name == '':
+            parent = self._root
+        else:
+            parent = get_column_node(self._root, tuple(parent_elem_name.split(".")))
+        self._update_element(parent, elem_key, elem_value)
+
+    def _is_absorbed(self, node: ColumnNode, elem_value: Union[dict, bool, float, int, str, list, type(None)]) -> bool:
+        """Whether elem_value can no longer change the schema of the saturated column node.
+        Scalars (or lists of scalars, once the column is REPEATED) cannot, and neither can dicts of scalars whose keys
+        are all known columns of a saturated RECORD, all of these checks running without a python level loop over
+        the fields.
+        """
+        value_type = type(elem_value)
+        if value_type in scalar_types:
+            return True
+        if value_type is list:
+            return node.mode_code == repeated_mode and scalar_types.issuperset(map(type, elem_value))
+        if value_type is dict:
+            return (node.unsaturated_children == 0
+                    and self._type_lattice.join_table[node.type_code][self._record_code] == node.type_code
+                    and elem_value.keys() <= node.children.keys()
+                    and scalar_types.issuperset(map(type, elem_value.values())))
+        return False
+
+    def _update_element(self, parent: ColumnNode, elem_key: str,
+                        elem_value: Union[dict, bool, float, int, str, list, type(None)]) -> None:
+        """updates the column tree by checking an element's value for its mode and type,
+        parent being the node of the element's parent (or the root for a top level element)
+        """
+        self._update_elements(parent, ((elem_key, elem_value),))
+
+    def _update_elements(self, parent: ColumnNode,
+                         elements: Iterable[Tuple[str, Union[dict, bool, float, int, str, list, type(None)]]]) -> None:
+        """updates the column tree with (key, value) elements nested in parent (e.g. the items of a record, parent
+        being the root), checking each value for its mode and type, and walking nested dicts and lists of dicts.
+        All nesting levels are walked in a single loop with an explicit stack, so that deeply nested values neither
+        pay a python call per field nor exceed the recursion limit. A column is typed before its nested columns.
+        RECORDs nested deeper than max_depth are handled according to max_depth_policy (see max_depth_policies).
+        """
+        record_code = self._record_code
+        codes = self._type_lattice.codes
+        max_depth = self._max_depth
+        update_column_node = self._update_column_node
+        types = self._types
+        classify = self._classify
+        depth = 1
+        ancestor = parent
+        while ancestor.parent is not None:
+            depth += 1
+            ancestor = ancestor.parent
+        deepest = 0
+        fields = 0
+
+        # each entry holds a column, an iterator over the elements nested in it and their depth
+        stack = [(parent, iter(elements), depth)]
+        while stack:
+            parent, elements, depth = stack[-1]
+            for elem_key, elem_value in elements:
+                fields += 1
+                if depth > deepest:
+                    deepest = depth
+                node = parent.children.get(elem_key)
+                if self._required_columns and node in self._required_columns:
+                    self._relax_required(node, elem_value)
+                # saturated column, nothing left to update
+                if node is not None and node.saturated and self._is_absorbed(node, elem_value):
+                    continue
+
+                # unknown type, ignore field
+                if elem_value is None or elem_value == [] or elem_value == {}:
+                    continue
+
+                # type the value without allocating anything per value,
+                # sampling huge lists once so that their type and nested records come from the same elements
+                if type(elem_value) is list:
+                    elem_value = self._sample_list(elem_value)
+                    type_name = self._get_list_type(elem_value)
+                    # a list of None elements only is as untyped as an empty list
+                    if type_name == "NULL":
+                        continue
+                    mode_code = repeated_mode
+                elif classify is not None and type(elem_value) is str:
+                    type_name = classify(elem_value)
+                    mode_code = nullable_mode
+                elif classify is not None and type(elem_value) is int:
+                    type_name = classify_integer(elem_value)
+                    mode_code = nullable_mode
+                else:
+                    type_name = types[type(elem_value)]
+                    mode_code = nullable_mode
+                type_code = codes.get(type_name)
+                if type_code is None:
+                    type_code = self._type_code(type_name, elem_key)
+
+                nested = type_code == record_code
+                if nested and max_depth is not None and depth > max_depth:
+                    if self._max_depth_policy == "raise":
+                        raise Exception(f"Maximum depth of {max_depth} exceeded by column: "
+                                        f"{'.'.join(self._column_path(parent) + (elem_key,))}")
+                    if self._max_depth_policy == "ignore":
+                        continue
+                    type_code = codes["STRING"]
+                    nested = False
 
-        # generate the element's name by joining it to its parents', separated by '.' character
-        elem_name = parent_elem_name+'.'+elem_key if parent_elem_name != '' else elem_key
-
-        # generate the element_schema dict by running get_mode_type on the elem_value,
-        # and adding the elem_key as 'NAME'
-        element_schema = self._get_mode_type(elem_value)
-        element_schema["name"] = elem_key
-
-        # if is dict/list, do recursion
-        if element_schema["type"] == "RECORD":
-            if element_schema["mode"] == "NULLABLE":  # is dict
-                for element_key, element_value in elem_value.items():
-                    self._get_element_schema(element_key, element_value, elem_name)
-            else:   # is list
-                for element in elem_value:
-                    # whether its primitive or record, just recurse as the field will be overwritten in the schema
-                    for e_k, e_v in element.items():
-                        self._get_element_schema(e_k, e_v, elem_name)
-
-        # update the schema_columns_dict with the element_schema dict and return it
-        # accumulator style hence objs with missing keys do not matter
-        # update the schema_columns_dict with the element_schema dict and return it
-        self._update_schema_columns_dict(elem_name, element_schema)
+                if node is None:
+                    node = add_column_node(parent, elem_key)
+                # accumulator style hence objs with missing keys do not matter
+                update_column_node(node, type_code, mode_code)
+
+                # if is dict/list, walk its elements, then resume with the next element of parent
+                if nested:
+                    if mode_code == nullable_mode:  # is dict
+                        stack.append((node, iter(elem_value.items()), depth + 1))
+                    else:  # is list
+                        stack.append((node, self._iter_list_elements(node, elem_value), depth + 1))
+                    break
+            else:
+                stack.pop()
+
+        if self.stats is not None:
+            self.stats.fields += fields
+            self.stats.max_depth = max(self.stats.max_depth, deepest)
+
+    def _iter_list_elements(
+            self, node: ColumnNode,
+            elem_value: list) -> Iterator[Tuple[str, Union[dict, bool, float, int, str, list, type(None)]]]:
+        """Yields the (key, value) elements of the records of a list, node being the list's column.
+        Records are checked lazily, so that a record is skipped if the ones before it saturated the column"""
+        for element in elem_value:
+            # primitive elements of a list mixing records and primitives cannot be nested
+            if type(element) is not dict or (node.saturated and self._is_absorbed(node, element)):
+                continue
+            yield from element.items()
+
+    def _column_path(self, node: ColumnNode) -> Tuple[str, ...]:
+        """Names of the columns from the top level down to node"""
+        path = []
+        while node.parent is not None:
+            path.append(node.name)
+            node = node.parent
+        return tuple(reversed(path))
+
+    def _type_code(self, type_name: str, elem_name: str) -> int:
+        """Code of type_name in the TypeLattice, raising an exception for types it does not know"""
+        type_code = self._type_lattice.codes.get(type_name)
+        if type_code is None:
+            raise Exception(f"Unknown datatype: {type_name}, for column: {elem_name}, \
+                found when parsing schema of records... terminating...")
+        return type_code
 
     def _update_schema_columns_dict(self, elem_name: str, element_schema: dict):
+        """Updates the column named elem_name (nested names separated by '.') with element_schema"""
+        type_code = self._type_code(element_schema["type"], elem_name)
+        node = get_column_node(self._root, tuple(elem_name.split(".")))
+        self._update_column_node(node, type_code, mode_codes[element_schema["mode"]])
+
+    def _update_column_node(self, node: ColumnNode, type_code: int, mode_code: int):
         """ Precision based datatype hiearchy
         Determines whether to use the incoming record's schema or re-use current one
         Looser types cannot be replaced by more precise types
         e.g. null/none > string > float > int
+        The column takes the join of both types in the TypeLattice, and is REPEATED if either mode is.
         """
+        if node.type_code is None:
+            self._set_column_schema(node, type_code, mode_code)
+            return
+        # a column already at a top type can no longer be widened, only become REPEATED
+        if self._type_lattice.top[node.type_code] and mode_code <= node.mode_code and not self._seed_columns:
+            return
 
-        incoming_type = element_schema["type"]
-        curr_type = get_dict_value(self.schema_columns_dict, elem_name+".type").value
-        if incoming_type in type_hierarchy:
-            if get_dict_value(self.schema_columns_dict, elem_name+".type").value is None:
-                self.schema_columns_dict[elem_name] = element_schema
-            elif incoming_type in type_hierarchy[curr_type]:
-                self.schema_columns_dict[elem_name] = element_schema
-            else:
-                pass  # do nth
-        else:
-            raise Exception(f"Unknown datatype: {incoming_type}, for column: {elem_name}, \
-                found when parsing schema of records... terminating...")
+        # a column seen with a list is REPEATED from then on
+        mode_code = max(node.mode_code, mode_code)
+        joined_type_code = self._type_lattice.join_table[node.type_code][type_code]
+        if joined_type_code != node.type_code or mode_code != node.mode_code:
+            self._set_column_schema(node, joined_type_code, mode_code)
+        # a type without a common type leaves the column as is, but a seeded column reports it
+        elif self._seed_columns and joined_type_code != type_code and node in self._seed_columns \
+                and not self._type_lattice.comparable(node.type_code, type_code):
+            self._restrict_to_seed(node, type_code, mode_code)
+
+    def _set_column_schema(self, node: ColumnNode, type_code: int, mode_code: int):
+        """Sets the type and mode of a column in place, keeping its parent's count of unsaturated children up to date
+        and marking it as changed since the last schema was built"""
+        if self._seed_columns and node in self._seed_columns:
+            type_code, mode_code = self._restrict_to_seed(node, type_code, mode_code)
+            if type_code == node.type_code and mode_code == node.mode_code:
+                return
+        mark_dirty(node)
+        self._schema_changes += 1
+        was_saturated = node.saturated
+        node.type_code = type_code
+        node.mode_code = mode_code
+        node.saturated = self._saturated[type_code]
+        if node.saturated != was_saturated:
+            node.parent.unsaturated_children += -1 if node.saturated else 1
 
     def _get_record_schema(self, record: List[Dict]) -> None:
         """Iterates through a list of dictionaries, checking each key-value pair for the value type, and updating
-        self.schema_columns_dict with the relevant information"""
-        for key, value in record.items():
-            self._get_element_schema(key, value, '')
+        the column tree with the relevant information
+        With the shape cache enabled, records are fingerprinted by their keys and the python types of their values.
+        Once a record has been merged into the column tree, merging the scalar fields of another record with the
+        same fingerprint cannot change anything, so on a cache hit only the fields holding dicts or lists
+        (whose contents the fingerprint does not cover) are walked, as well as strings and ints when types are
+        detected."""
+        if self._required_columns and self._root in self._required_columns:
+            self._relax_required(self._root, record)
+        if self._shape_cache_size <= 0:
+            self._update_elements(self._root, record.items())
+            return
+
+        shape = (tuple(record), tuple(map(type, record.values())))
+        nested_keys = self._shape_cache.get(shape)
+        if nested_keys is not None:
+            self._shape_cache_hits += 1
+            self._shape_cache.move_to_end(shape)
+            self._update_elements(self._root, [(key, record[key]) for key in nested_keys])
+            return
+
+        self._shape_cache_misses += 1
+        self._update_elements(self._root, record.items())
+        self._shape_cache[shape] = tuple(key for key, value_type in zip(shape[0], shape[1])
+                                         if value_type is dict or value_type is list
+                                         or ((value_type is str or value_type is int) and self._classify is not None))
+        if len(self._shape_cache) > self._shape_cache_size:
+            self._shape_cache.popitem(last=False)
+
+    def shape_cache_info(self) -> ShapeCacheInfo:
+        """Hits, misses, maximum and current size of the shape cache, to help tune shape_cache_size"""
+        return ShapeCacheInfo(self._shape_cache_hits, self._shape_cache_misses, self._shape_cache_size,
+                              len(self._shape_cache))
 
     def _construct_nesting_dict(self, schema_columns_dict: dict) -> dict:
         """Iterates through a schema dictionary checking how many levels each schema column is nested (based on the
@@ -124,6 +688,7 @@ class SchemaGenerator(object):
         Stores this information in a dictionary (nesting_dict) with 'key' = no. of levels, and 'value' = a list of
         schema column names with the same level of nesting
         Example return value: {1: ['col_1', 'col_2'], 2: ['col_1.col_3', 'col_1.col_4'], 3: ['col_1.col_3.col_5']}
+        No longer used to construct the schema, kept for backward compatibility
         """
         nesting_dict = {}
 
@@ -140,52 +705,262 @@ class SchemaGenerator(object):
 
         return nesting_dict
 
-    def _construct_bq_schema(self, schema_columns_dict: dict) -> None:
-        """Takes a schema_columns_dict object and constructs a list of dictionaries which can be consumed
-        by the Big Query API as a schema
+    def _construct_bq_schema(self, schema_columns_dict: dict = None) -> None:
+        """Constructs a list of dictionaries which can be consumed by the Big Query API as a schema from the
+        column tree, and stores it in self.bq_consumable_schema.
+        For backward compatibility, a schema_columns_dict keyed by '.' separated column names can be given instead,
+        it is then loaded into a column tree of its own first
         """
-        nesting_dict = self._construct_nesting_dict(schema_columns_dict)
-        if len(nesting_dict) == 0:
-            logging.info("empty nesting dict, returning function")
-            return
-        # Iterate over the nesting levels backwards, from the most nested level to level 2
-        for nest_level in range(max(nesting_dict), 1, -1):
-            # iterate over the schema keys of that nesting level
-            for schema_key in nesting_dict[nest_level]:
-                # A column of type "RECORD" must have fields, ie any empty dictionaries are removed
-                if schema_columns_dict[schema_key]["type"] == "RECORD":
-                    if "fields" not in schema_columns_dict[schema_key]:
-                        schema_columns_dict.pop(schema_key)
-                        continue
-                parent = ".".join(schema_key.split(".")[:-1])
-                # Update the parent column's fields with the present column
-                if "fields" in schema_columns_dict[parent]:
-                    schema_columns_dict[parent]["fields"].append(schema_columns_dict[schema_key])
-                else:
-                    schema_columns_dict[parent]["fields"] = [(schema_columns_dict[schema_key])]
-                # Pop the present column from the dictionary
-                schema_columns_dict.pop(schema_key)
-
-        # Finally, we are only left with the level 1 columns,
-        # that have been updated with its nested columns (in "fields"), if any.
-        # Append these to the final_schema list
-        for col_name, schema_column in schema_columns_dict.items():
-            # check if 'schema_column' is a "RECORD" type without "fields", skip if so
-            if schema_column["type"] == "RECORD":
-                if "fields" not in schema_column:
-                    continue
-            # check if a default type has been specified for this
-            if col_name in self.default_column_types:
-                schema_column["type"] = self.default_column_types[col_name]
+        root = self._root if schema_columns_dict is None else build_column_tree(schema_columns_dict, self._type_lattice)
+        fields = self._construct_fields(root)
+        # check if a default type has been specified for the top level columns
+        self.bq_consumable_schema = FrozenList(FrozenDict(field, type=self.default_column_types[field["name"]])
+                                               if field["name"] in self.default_column_types else field
+                                               for field in fields)
+
+    def _construct_fields(self, root: ColumnNode) -> FrozenList:
+        """Constructs the list of schema fields of root's columns in a single post-order pass over the column tree.
+        A column's field is only rebuilt when the column is marked as changed, the cached field of any other column
+        is reused as is, so the pass takes O(changed columns) time and at most O(columns).
+        It uses an explicit stack, so deeply nested columns cannot exceed the recursion limit.
+        """
+        # each entry holds a column, an iterator over its nested columns and the fields constructed so far
+        stack = [(root, iter(root.children.values()), [])]
+        while True:
+            node, children, fields = stack[-1]
+            for child in children:
+                if child.dirty:
+                    # construct the changed nested column first, then resume with the next one
+                    stack.append((child, iter(child.children.values()), []))
+                    break
+                if child.output is not None:
+                    fields.append(child.output)
+            else:
+                stack.pop()
+                node.dirty = False
+                if len(stack) == 0:
+                    return FrozenList(fields)
+                node.output = self._construct_column(node, FrozenList(fields))
+                if node.output is not None:
+                    stack[-1][2].append(node.output)
 
-            self.bq_consumable_schema.append(schema_column)
+    def _construct_column(self, node: ColumnNode, nested_fields: FrozenList) -> Union[FrozenDict, None]:
+        """Constructs the schema field of a column given the fields of its nested columns,
+        omitting RECORDs without any fields"""
+        if node.type_code is None:
+            return None
+        field = FrozenDict(mode=mode_names[node.mode_code], type=self._type_lattice.names[node.type_code],
+                           name=node.name)
+        if node.type_code != self._record_code:
+            return field
+        if len(nested_fields) == 0:
+            return None
+        return FrozenDict(field, fields=nested_fields)
 
     def update_schema_columns(self, batch: List[List[Dict]]) -> None:
-        """Iterates through the records of a batch and updates self.schema_columns_dict with relevant information
+        """Iterates through the records of a batch and updates the column tree with relevant information
         required to construct a Big Query schema"""
+        if self._record_sampling == "full" and self._stop_after_unchanged is None:
+            rows_seen = self._rows_seen
+            for record in batch:
+                self._get_record_schema(record)
+                self._rows_seen += 1
+            self._rows_examined += self._rows_seen - rows_seen
+            return
+
+        if self._record_sampling == "reservoir":
+            for record in batch:
+                self._add_to_reservoir(record)
+            return
+
         for record in batch:
-            self._get_record_schema(record)
+            if self.converged:
+                # stop pulling records, the batch may be unbounded
+                return
+            self._rows_seen += 1
+            if self._record_sampling == "bernoulli" and self._record_random.random() >= self._record_sample_rate:
+                continue
+            self._examine_record(record)
+
+    def _examine_record(self, record: Dict) -> None:
+        """Updates the column tree with a record, counting the consecutive records that did not change it"""
+        self._rows_examined += 1
+        schema_changes = self._schema_changes
+        self._get_record_schema(record)
+        if self._schema_changes == schema_changes:
+            self._unchanged_records += 1
+        else:
+            self._unchanged_records = 0
+
+    def _add_to_reservoir(self, record: Dict) -> None:
+        """Keeps a uniform sample of record_sample_size records among those seen (Algorithm R).
+        Sampled records are only examined when the schema is requested, as later records may replace them"""
+        self._rows_seen += 1
+        if len(self._reservoir) < self._record_sample_size:
+            self._reservoir_pending.add(len(self._reservoir))
+            self._reservoir.append(record)
+            return
+        slot = self._record_random.randrange(self._rows_seen)
+        if slot < self._record_sample_size:
+            self._reservoir[slot] = record
+            self._reservoir_pending.add(slot)
+
+    def _merge_reservoir(self) -> None:
+        """Examines the sampled records not examined yet.
+        Once examined, a record stays in the schema even if it is later replaced in the reservoir, so the schema
+        covers the current sample and the samples of every earlier request"""
+        for slot in sorted(self._reservoir_pending):
+            self._examine_record(self._reservoir[slot])
+        self._reservoir_pending.clear()
+
+    @property
+    def converged(self) -> bool:
+        """Whether stop_after_unchanged consecutive records were examined without changing the schema,
+        any further records being ignored"""
+        return self._stop_after_unchanged is not None and self._unchanged_records >= self._stop_after_unchanged
+
+    def inference_info(self) -> InferenceInfo:
+        """How many records were seen and examined, and whether the schema converged (see stop_after_unchanged)"""
+        self._merge_reservoir()
+        return InferenceInfo(self._rows_seen, self._rows_examined, self.converged)
+
+    async def update_schema_columns_async(self, records: AsyncIterable[Dict], batch_size: int = 1000,
+                                          max_wait: float = 1.0) -> None:
+        """Consumes an asynchronous iterable of records (e.g. a Kafka consumer) in micro-batches of batch_size records,
+        yielding to the event loop after each of them so that other tasks are never blocked for long.
+        A partial batch is merged at least every max_wait seconds (unless max_wait is None), so that the interim
+        schema does not lag behind a source that went quiet. Other tasks can await get_bq_schema_async at any time
+        to get an interim schema covering every record consumed so far."""
+        flusher = None
+        if max_wait is not None:
+            flusher = asyncio.ensure_future(self._flush_async_batch_every(max_wait))
+        try:
+            async for record in records:
+                if self.converged:
+                    break
+                self._async_batch.append(record)
+                if len(self._async_batch) >= batch_size:
+                    self._flush_async_batch()
+                    await asyncio.sleep(0)
+        finally:
+            if flusher is not None:
+                flusher.cancel()
+            self._flush_async_batch()
+
+    def _flush_async_batch(self) -> None:
+        """Merges the records consumed by update_schema_columns_async that are not merged yet"""
+        if self._async_batch:
+            batch, self._async_batch = self._async_batch, []
+            self.update_schema_columns(batch)
+
+    async def _flush_async_batch_every(self, max_wait: float) -> None:
+        while True:
+            await asyncio.sleep(max_wait)
+            self._flush_async_batch()
+
+    async def get_bq_schema_async(self) -> List[Dict]:
+        """Interim schema of the records consumed so far by update_schema_columns_async, including those of the
+        batch being filled, after yielding to the event loop"""
+        await asyncio.sleep(0)
+        self._flush_async_batch()
+        return self.get_bq_schema()
+
+    def update_from_ndjson(self, path_or_fileobj: Source, chunk_size: int = DEFAULT_CHUNK_SIZE,
+                           use_mmap: bool = False, schema_only: bool = False) -> None:
+        """Streams the records of a newline-delimited JSON file (optionally gzip compressed) into the column tree,
+        reading it chunk_size bytes at a time so that memory usage does not grow with the size of the file.
+        schema_only skips decoding the contents of string values, which cannot change their columns' schema
+        (unless types are detected, short strings being decoded then). It only pays off on long strings with
+        many escaped characters, and is slower than plain decoding on short strings"""
+        max_kept_length = MAX_CLASSIFIED_LENGTH if self._classify is not None else 0
+        self.update_schema_columns(iter_ndjson(path_or_fileobj, chunk_size, use_mmap, schema_only, max_kept_length))
+
+    def update_from_csv(self, path_or_fileobj: Source, chunk_size: int = DEFAULT_CHUNK_SIZE,
+                        use_mmap: bool = False, **reader_kwargs) -> None:
+        """Streams the rows of a CSV file (optionally gzip compressed) with a header line into the column tree,
+        reading it chunk_size bytes at a time. Empty cells are treated as missing values"""
+        self.update_schema_columns(iter_csv(path_or_fileobj, chunk_size, use_mmap, **reader_kwargs))
+
+    def update_from_columns(self, table) -> None:
+        """Updates the column tree from a batch of records held in columns: a pyarrow Table, a pandas DataFrame or a
+        mapping of column names to numpy arrays, array.arrays or lists.
+        Columns are typed from their data type whenever possible, so that a batch costs O(columns) rather than
+        O(cells). Columns of python objects are typed from the set of their values' types, collected at C speed,
+        and only those holding dicts or lists are walked value by value.
+        Missing values (None, NaN, NaT) are ignored, like None values in records, but relax REQUIRED seeded columns
+        to NULLABLE, as does a table lacking them."""
+        if self._root in self._required_columns:
+            missing_names = columns_with_missing_values(table, self._required_columns[self._root])
+            if missing_names:
+                self._relax_columns(self._root, missing_names)
+        for name, column_type, values in iter_table_columns(table, self._classify is not None):
+            node = self._root.children.get(name)
+            if column_type is None:
+                element_types = set(map(type, values))
+                homogeneous = len(element_types) == 1
+                if dict in element_types or list in element_types:
+                    self._update_elements(self._root, ((name, value) for value in values))
+                    continue
+                # saturated column, no scalar can change it, so its values need not be classified
+                if node is not None and node.saturated:
+                    continue
+                element_types.discard(type(None))
+                # in columns of python objects, missing values are often NaN rather than None
+                if float in element_types and all(value != value for value in values if type(value) is float):
+                    element_types.discard(float)
+                if len(element_types) == 0:
+                    continue
+                column_type = self._join_value_types(element_types, values, homogeneous)
+            elif column_type == "NULL":
+                continue
+
+            type_code = self._type_code(column_type, name)
+            if node is None:
+                node = add_column_node(self._root, name)
+            self._update_column_node(node, type_code, nullable_mode)
+
+    def merge(self, other: "SchemaGenerator") -> "SchemaGenerator":
+        """Merges the columns of another generator (e.g. one that ran over a different shard of the records) into
+        this one, using the same precision hierarchy as when updating from records.
+        Merging is associative and commutative as long as all the types met have a common type (which is the case
+        with the default type hierarchies), and merging the generators of consecutive shards in order gives the
+        same schema as a single generator running over all of their records.
+        REQUIRED seeded columns are relaxed to NULLABLE when the other generator lacks them while having seen their
+        parent (records for top level columns), or has them seeded but relaxed to NULLABLE (the columns of an unseeded
+        generator are NULLABLE whether their values were missing or not).
+        """
+        self._merge_reservoir()
+        other._merge_reservoir()
+        stack = [(self._root, other._root)]
+        while stack:
+            node, other_node = stack.pop()
+            if self._required_columns and node in self._required_columns \
+                    and (other_node.type_code is not None or other._rows_seen > 0 or other_node.children):
+                missing_names = [name for name in self._required_columns[node]
+                                 if name not in other_node.children
+                                 or (other_node.children[name].mode_code == nullable_mode
+                                     and other_node.children[name] in other._seed_columns)]
+                if missing_names:
+                    self._relax_columns(node, missing_names)
+            for name, other_child in other_node.children.items():
+                child = node.children.get(name)
+                if child is None:
+                    child = add_column_node(node, name)
+                if other_child.type_code is not None:
+                    type_code = self._type_code(other._type_lattice.names[other_child.type_code], name)
+                    self._update_column_node(child, type_code, other_child.mode_code)
+                stack.append((child, other_child))
+        return self
 
-    def get_bq_schema(self):
-        self._construct_bq_schema(self.schema_columns_dict)
-        return self.bq_consumable_schema
+    def get_bq_schema(self) -> List[Dict]:
+        """Returns the Big Query schema of the records seen so far, as an immutable snapshot that later updates do not
+        affect. The generator keeps accumulating, and only the columns that changed since the previous call are
+        rebuilt, so it can be called mid-stream as often as needed. If nothing changed, the same snapshot is
+        returned again."""
+        self._merge_reservoir()
+        if self._snapshot is None or self._root.dirty \
+                or self._snapshot_default_column_types != self.default_column_types:
+            self._construct_bq_schema()
+            self._snapshot = self.bq_consumable_schema
+            self._snapshot_default_column_types = dict(self.default_column_types)
+        return self._snapshot
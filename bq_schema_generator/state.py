@@ -0,0 +1,157 @@
+from typing import Dict, List, Optional, Tuple
+from .column_tree import ColumnNode, add_column_node, mode_codes, mode_names
+from .type_lattice import TypeLattice
+
+# Binary format of a column tree, all integers being unsigned LEB128 varints:
+#   magic, version
+#   type names table: count, then each name's utf-8 length and bytes
+#   mode names table: same layout
+#   root: number of top level columns
+#   then every column in pre-order: name (utf-8 length and bytes), type code + 1, mode code + 1
+#   (0 for an untyped column), then the same for the type and mode it was seeded with and for the change
+#   records proposed to it (0 if it was not seeded, or no change was proposed), number of nested columns
+# Version 1 states have no seeded and proposed types and modes.
+STATE_MAGIC = b"BQSG"
+STATE_VERSION = 2
+SUPPORTED_STATE_VERSIONS = (1, 2)
+
+TypeMode = Tuple[int, int]
+
+
+def _write_varint(out: bytearray, value: int) -> None:
+    while value >= 0x80:
+        out.append((value & 0x7f) | 0x80)
+        value >>= 7
+    out.append(value)
+
+
+def _read_varint(data: bytes, offset: int) -> Tuple[int, int]:
+    value = 0
+    shift = 0
+    while True:
+        if offset >= len(data):
+            raise Exception("Not a SchemaGenerator state: truncated data")
+        byte = data[offset]
+        offset += 1
+        value |= (byte & 0x7f) << shift
+        if byte < 0x80:
+            return value, offset
+        shift += 7
+
+
+def _write_string(out: bytearray, value: str) -> None:
+    encoded = value.encode("utf-8")
+    _write_varint(out, len(encoded))
+    out += encoded
+
+
+def _read_string(data: bytes, offset: int) -> Tuple[str, int]:
+    length, offset = _read_varint(data, offset)
+    if offset + length > len(data):
+        raise Exception("Not a SchemaGenerator state: truncated data")
+    try:
+        return data[offset:offset + length].decode("utf-8"), offset + length
+    except UnicodeDecodeError:
+        raise Exception("Not a SchemaGenerator state: invalid utf-8 name") from None
+
+
+def dump_column_tree(root: ColumnNode, type_lattice: TypeLattice, seed_columns: Dict[ColumnNode, TypeMode] = None,
+                     proposed_changes: Dict[ColumnNode, TypeMode] = None) -> bytes:
+    """Serializes the column tree below root, typed in type_lattice, to the compact binary format described above,
+    along with the types and modes its columns were seeded with and the changes proposed to them.
+    Types and modes are stored by name, so a state does not depend on the order types were registered in"""
+    seed_columns = seed_columns if seed_columns is not None else {}
+    proposed_changes = proposed_changes if proposed_changes is not None else {}
+    type_names = {}
+    state_modes = {}
+
+    def write_type_mode(type_mode: Optional[TypeMode]) -> None:
+        if type_mode is None:
+            columns.extend(b"\x00\x00")
+        else:
+            _write_varint(columns, type_names.setdefault(type_lattice.names[type_mode[0]], len(type_names)) + 1)
+            _write_varint(columns, state_modes.setdefault(mode_names[type_mode[1]], len(state_modes)) + 1)
+
+    columns = bytearray()
+    _write_varint(columns, len(root.children))
+    stack = list(reversed(root.children.items()))
+    while stack:
+        name, node = stack.pop()
+        _write_string(columns, name)
+        write_type_mode((node.type_code, node.mode_code) if node.type_code is not None else None)
+        write_type_mode(seed_columns.get(node))
+        write_type_mode(proposed_changes.get(node))
+        _write_varint(columns, len(node.children))
+        stack.extend(reversed(node.children.items()))
+
+    out = bytearray(STATE_MAGIC)
+    _write_varint(out, STATE_VERSION)
+    for names in (type_names, state_modes):
+        _write_varint(out, len(names))
+        for name in names:
+            _write_string(out, name)
+    return bytes(out + columns)
+
+
+def load_column_tree(data: bytes, type_lattice: TypeLattice) \
+        -> Tuple[ColumnNode, Dict[ColumnNode, TypeMode], Dict[ColumnNode, TypeMode]]:
+    """Deserializes a column tree dumped by dump_column_tree, types being coded in type_lattice, and returns its root
+    along with the types and modes its columns were seeded with and the changes proposed to them.
+    Only the columns' types and modes are restored, their saturation is left to the generator loading them"""
+    if data[:len(STATE_MAGIC)] != STATE_MAGIC:
+        raise Exception("Not a SchemaGenerator state: wrong magic bytes")
+    version, offset = _read_varint(data, len(STATE_MAGIC))
+    if version not in SUPPORTED_STATE_VERSIONS:
+        raise Exception(f"Unsupported SchemaGenerator state version: {version}, expected one of "
+                        f"{SUPPORTED_STATE_VERSIONS}")
+
+    tables: List[List[str]] = []
+    for _ in range(2):
+        count, offset = _read_varint(data, offset)
+        names = []
+        for _ in range(count):
+            name, offset = _read_string(data, offset)
+            names.append(name)
+        tables.append(names)
+    type_codes = [type_lattice.code(name) for name in tables[0]]
+    if not set(tables[1]) <= mode_codes.keys():
+        raise Exception(f"Not a SchemaGenerator state: unknown modes {sorted(set(tables[1]) - mode_codes.keys())}")
+    state_modes = [mode_codes[name] for name in tables[1]]
+
+    def read_type_mode(name: str) -> Optional[TypeMode]:
+        nonlocal offset
+        type_code, offset = _read_varint(data, offset)
+        mode_code, offset = _read_varint(data, offset)
+        if type_code > len(type_codes) or (type_code > 0) != (0 < mode_code <= len(state_modes)):
+            raise Exception(f"Not a SchemaGenerator state: invalid type or mode code for column: {name}")
+        return (type_codes[type_code - 1], state_modes[mode_code - 1]) if type_code > 0 else None
+
+    seed_columns = {}
+    proposed_changes = {}
+    root = ColumnNode()
+    count, offset = _read_varint(data, offset)
+    # each entry holds a parent and its number of nested columns left to read
+    stack = [[root, count]]
+    while stack:
+        if stack[-1][1] == 0:
+            stack.pop()
+            continue
+        stack[-1][1] -= 1
+        name, offset = _read_string(data, offset)
+        type_mode = read_type_mode(name)
+        seed = read_type_mode(name) if version > 1 else None
+        proposed = read_type_mode(name) if version > 1 else None
+        count, offset = _read_varint(data, offset)
+        if (seed is not None or proposed is not None) and (type_mode is None or seed is None):
+            raise Exception(f"Not a SchemaGenerator state: invalid seed for column: {name}")
+        node = add_column_node(stack[-1][0], name)
+        if type_mode is not None:
+            node.type_code, node.mode_code = type_mode
+        if seed is not None:
+            seed_columns[node] = seed
+        if proposed is not None:
+            proposed_changes[node] = proposed
+        stack.append([node, count])
+    if offset != len(data):
+        raise Exception("Not a SchemaGenerator state: trailing data after the columns")
+    return root, seed_columns, proposed_changes
@@ -0,0 +1,53 @@
+from typing import Dict
+
+# phases of schema generation that are timed, named after the SchemaGenerator methods running them
+stats_phases = ("get_record_schema", "update_schema_columns_dict", "construct_bq_schema")
+
+# name, metric type and help text of the counters exported to Prometheus
+stats_counters = (
+    ("records", "counter", "Records processed"),
+    ("fields", "counter", "Fields visited, nested fields included"),
+    ("merges", "counter", "Field schemas merged into a column"),
+    ("widenings", "counter", "Merges that changed the type of an already typed column"),
+    ("max_depth", "gauge", "Deepest nesting level of the fields visited"),
+)
+
+
+class SchemaStats(object):
+    """
+    Counters and phase timings collected by a SchemaGenerator created with collect_stats=True.
+    Phases are nested: merges happen while records are processed, so the time spent in update_schema_columns_dict
+    is also part of the time spent in get_record_schema.
+    """
+
+    def __init__(self):
+        self.reset()
+
+    def reset(self) -> None:
+        self.records = 0
+        self.fields = 0
+        self.merges = 0
+        self.widenings = 0
+        self.max_depth = 0
+        self.phase_seconds = {phase: 0.0 for phase in stats_phases}
+        self.phase_calls = {phase: 0 for phase in stats_phases}
+
+    def to_dict(self) -> Dict:
+        stats = {name: getattr(self, name) for name, _, _ in stats_counters}
+        stats["phases"] = {phase: {"seconds": self.phase_seconds[phase], "calls": self.phase_calls[phase]}
+                           for phase in stats_phases}
+        return stats
+
+    def to_prometheus(self, prefix: str = "bq_schema_generator") -> str:
+        """Exports the stats in the Prometheus text exposition format"""
+        lines = []
+        for name, metric_type, help_text in stats_counters:
+            metric = f"{prefix}_{name}_total" if metric_type == "counter" else f"{prefix}_{name}"
+            lines += [f"# HELP {metric} {help_text}", f"# TYPE {metric} {metric_type}",
+                      f"{metric} {getattr(self, name)}"]
+        for metric, help_text, values in ((f"{prefix}_phase_seconds_total", "Time spent in each phase",
+                                           self.phase_seconds),
+                                          (f"{prefix}_phase_calls_total", "Calls to each phase", self.phase_calls)):
+            lines += [f"# HELP {metric} {help_text}", f"# TYPE {metric} counter"]
+            lines += [f'{metric}{{phase="{phase}"}} {values[phase]}' for phase in stats_phases]
+        return "\n".join(lines) + "\n"
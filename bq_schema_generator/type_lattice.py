@@ -0,0 +1,98 @@
+from typing import Dict, List, Union
+
+
+class TypeLattice(object):
+    """
+    Compiled form of a precision based type hierarchy.
+    Every type is given a small integer code, and the hierarchy is compiled once into a join table,
+    so that merging a column's current type with an incoming one is a single lookup:
+    join_table[current_code][incoming_code] is the code of the type the column should end up with.
+    Widening rules are transitive, i.e. if FLOAT can be overwritten by STRING and STRING by RECORD,
+    FLOAT can also be overwritten by RECORD.
+    Two types are joined into the least precise type that can overwrite both (e.g. BOOLEAN and FLOAT into STRING).
+    When every pair of types has such a common type, as in the default hierarchies, the join is commutative and
+    associative, so columns do not depend on the order records are seen in.
+    Types without a common type keep the current one, which does depend on that order (see comparable()).
+    Rules should be registered before the lattice is handed to a SchemaGenerator.
+    """
+
+    def __init__(self, type_hierarchy: Dict[str, List[str]] = None):
+        self._widenings = {}
+        self.names = []
+        self.codes = {}
+        self.join_table = []
+        self.top = []
+        if type_hierarchy is not None:
+            for loose_type, precise_types in type_hierarchy.items():
+                self.add_type(loose_type)
+                for precise_type in precise_types:
+                    self.add_widening(loose_type, precise_type)
+        self.compile()
+
+    def add_type(self, name: str) -> None:
+        """Registers a type that cannot be overwritten by any other type until a widening rule says so"""
+        if name not in self._widenings:
+            self._widenings[name] = set()
+            self.compile()
+
+    def add_widening(self, loose_type: str, precise_type: str) -> None:
+        """Registers a rule allowing precise_type to overwrite loose_type"""
+        self.add_type(loose_type)
+        self.add_type(precise_type)
+        self._widenings[loose_type].add(precise_type)
+        self.compile()
+
+    def compile(self) -> None:
+        """Assigns every type its code and builds the join table"""
+        self.names = list(self._widenings)
+        self.codes = {name: code for code, name in enumerate(self.names)}
+
+        # transitive closure of the widening rules
+        overwritten_by = []
+        for name in self.names:
+            reachable = set()
+            stack = list(self._widenings[name])
+            while stack:
+                precise_type = stack.pop()
+                if precise_type not in reachable and precise_type != name:
+                    reachable.add(precise_type)
+                    stack.extend(self._widenings[precise_type])
+            overwritten_by.append({self.codes[precise_type] for precise_type in reachable})
+
+        # least upper bound of every pair of types
+        upper_bounds = [overwritten_by[code] | {code} for code in range(len(self.names))]
+        self.join_table = []
+        for current in range(len(self.names)):
+            row = []
+            for incoming in range(len(self.names)):
+                common = upper_bounds[current] & upper_bounds[incoming]
+                least = [code for code in common if common <= upper_bounds[code]]
+                row.append(least[0] if len(least) == 1 else current)
+            self.join_table.append(row)
+        # top types cannot be overwritten by anything
+        self.top = [len(overwritten_by[code]) == 0 for code in range(len(self.names))]
+
+    def copy(self) -> "TypeLattice":
+        """Copy of the lattice, which types and rules can be registered in without changing this one"""
+        type_lattice = TypeLattice()
+        type_lattice._widenings = {name: set(precise_types) for name, precise_types in self._widenings.items()}
+        type_lattice.compile()
+        return type_lattice
+
+    def code(self, name: str) -> int:
+        if name not in self.codes:
+            raise Exception(f"Unknown datatype: {name}")
+        return self.codes[name]
+
+    def name(self, code: int) -> str:
+        return self.names[code]
+
+    def comparable(self, current: int, incoming: int) -> bool:
+        """Whether two types have a common type they can be joined into"""
+        return self.join_table[current][incoming] == self.join_table[incoming][current]
+
+    def join(self, current: Union[int, None], incoming: int) -> int:
+        """Code of the type a column of type `current` (None if not yet typed) takes after seeing `incoming`"""
+        if current is None:
+            return incoming
+        return self.join_table[current][incoming]
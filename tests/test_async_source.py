@@ -0,0 +1,54 @@
+import asyncio
+from bq_schema_generator.async_source import MemoryRecordSource
+from bq_schema_generator.schema_generator import SchemaGenerator
+
+
+value_async_1 = [{"k_1": 10, "k_2": "a"}, {"k_1": "b", "k_3": {"kk_1": True}}, {"k_2": None}]
+
+def test_update_schema_columns_async():
+    schema_generator = SchemaGenerator()
+    asyncio.run(schema_generator.update_schema_columns_async(MemoryRecordSource(value_async_1), batch_size=2))
+    serial_generator = SchemaGenerator()
+    serial_generator.update_schema_columns(value_async_1)
+    assert schema_generator.get_bq_schema() == serial_generator.get_bq_schema()
+
+def test_interim_schema():
+    async def run():
+        source = MemoryRecordSource()
+        schema_generator = SchemaGenerator()
+        consumer = asyncio.create_task(schema_generator.update_schema_columns_async(source, batch_size=1))
+        await source.put(value_async_1[0])
+        while len(schema_generator.get_bq_schema()) < 2:
+            await asyncio.sleep(0)
+        interim_schema = schema_generator.get_bq_schema()
+        for record in value_async_1[1:]:
+            await source.put(record)
+        source.close()
+        await consumer
+        return interim_schema, schema_generator.get_bq_schema()
+
+    interim_schema, final_schema = asyncio.run(run())
+    assert interim_schema == [{'mode': 'NULLABLE', 'type': "FLOAT", 'name': 'k_1'},
+                              {'mode': 'NULLABLE', 'type': "STRING", 'name': 'k_2'}]
+    assert final_schema[0] == {'mode': 'NULLABLE', 'type': "STRING", 'name': 'k_1'}
+    assert len(final_schema) == 3
+
+def test_idle_source_is_flushed():
+    async def run(max_wait):
+        source = MemoryRecordSource()
+        schema_generator = SchemaGenerator()
+        consumer = asyncio.create_task(schema_generator.update_schema_columns_async(source, max_wait=max_wait))
+        for _ in range(999):
+            await source.put(value_async_1[0])
+        await asyncio.sleep(0.2)
+        idle_schema = schema_generator.get_bq_schema()
+        awaited_schema = await schema_generator.get_bq_schema_async()
+        source.close()
+        await consumer
+        return idle_schema, awaited_schema
+
+    expected_schema = [{'mode': 'NULLABLE', 'type': "FLOAT", 'name': 'k_1'},
+                       {'mode': 'NULLABLE', 'type': "STRING", 'name': 'k_2'}]
+    assert asyncio.run(run(0.05)) == (expected_schema, expected_schema)
+    # without max_wait, the partial batch is only merged when the interim schema is awaited
+    assert asyncio.run(run(None)) == ([], expected_schema)
@@ -0,0 +1,35 @@
+import pytest
+
+from benchmarks.payloads import scenarios
+from benchmarks.run_benchmarks import find_regressions, run_scenario
+
+
+@pytest.mark.parametrize("scenario", sorted(scenarios))
+def test_payloads_are_deterministic(scenario):
+    assert scenarios[scenario](5) == scenarios[scenario](5)
+
+
+@pytest.mark.parametrize("scenario", sorted(scenarios))
+def test_run_scenario(scenario):
+    result = run_scenario(scenario, 5, repeat=1)
+    assert result["scenario"] == scenario
+    assert result["rows"] == 5
+    assert result["rows_per_sec"] > 0
+    assert result["peak_allocated_bytes"] > 0
+    assert result["payload_rss_bytes"] > 0
+    assert result["rss_growth_bytes"] >= 0
+
+
+def test_find_regressions():
+    baseline = [{"scenario": "wide", "rows_per_sec": 1000}, {"scenario": "deep", "rows_per_sec": 1000}]
+    results = [{"scenario": "wide", "rows_per_sec": 850}, {"scenario": "deep", "rows_per_sec": 950},
+               {"scenario": "ragged", "rows_per_sec": 1}]
+    assert find_regressions(results, baseline, 0.1) == ["wide: 850 rows/sec, baseline 1000 rows/sec"]
+
+
+def test_find_memory_regressions():
+    baseline = [{"scenario": "wide", "rows_per_sec": 1000, "peak_allocated_bytes": 1000},
+                {"scenario": "deep", "rows_per_sec": 1000, "peak_allocated_bytes": 1000}]
+    results = [{"scenario": "wide", "rows_per_sec": 1000, "peak_allocated_bytes": 1200},
+               {"scenario": "deep", "rows_per_sec": 1000, "peak_allocated_bytes": 1050}]
+    assert find_regressions(results, baseline, 0.1) == ["wide: 1200 bytes allocated, baseline 1000 bytes allocated"]
@@ -0,0 +1,98 @@
+import array
+import datetime
+import decimal
+import io
+import pytest
+from bq_schema_generator import batch_to_bq_schema
+from bq_schema_generator.classifiers import classify_integer, classify_string
+from bq_schema_generator.readers import _skeletonize
+from bq_schema_generator.schema_generator import SchemaGenerator
+
+
+@pytest.mark.parametrize("value, expected_result", [("12", "INTEGER"), ("-3", "INTEGER"), ("0", "INTEGER"),
+                                                    ("007", "STRING"), ("1.50", "NUMERIC"),
+                                                    ("12345678901234567890", "NUMERIC"), ("1e5", "FLOAT"),
+                                                    ("1e-5", "FLOAT"), ("-2.5E+10", "FLOAT"),
+                                                    ("0.30000000000000004", "FLOAT"), ("2.3522219000", "FLOAT"),
+                                                    ("1" * 30, "FLOAT"), ("1.5e", "STRING"), ("007.5", "STRING"),
+                                                    ("2020-01-31", "DATE"), ("2020-13-01", "STRING"),
+                                                    ("2020-02-29", "DATE"), ("2020-02-31", "STRING"),
+                                                    ("2019-02-29 10:00:00", "STRING"), ("2020-01-31 10:00", "STRING"),
+                                                    ("2020-01-31T10:00:00Z", "TIMESTAMP"),
+                                                    ("2020-01-31 10:00:00.123456+02:00", "TIMESTAMP"),
+                                                    ("true", "BOOLEAN"), ("FALSE", "BOOLEAN"), ("t", "STRING"),
+                                                    ("", "STRING"), ("some text", "STRING"), ("1" * 41, "STRING")])
+def test_classify_string(value, expected_result):
+    assert classify_string(value) == expected_result
+
+value_detect_types_1 = [{"k_1": 1, "k_2": "12", "k_3": "2020-01-31", "k_4": "true", "k_5": ["1", "2.5"],
+                         "k_6": datetime.datetime(2020, 1, 31), "k_7": decimal.Decimal("1.5")},
+                        {"k_1": 2, "k_2": "1.5", "k_3": "2020-01-31T10:00:00", "k_4": "yes", "k_5": []}]
+expected_r_detect_types_1 = [{'mode': 'NULLABLE', 'type': "INTEGER", 'name': 'k_1'},
+                             {'mode': 'NULLABLE', 'type': "NUMERIC", 'name': 'k_2'},
+                             {'mode': 'NULLABLE', 'type': "TIMESTAMP", 'name': 'k_3'},
+                             {'mode': 'NULLABLE', 'type': "STRING", 'name': 'k_4'},
+                             {'mode': 'REPEATED', 'type': "NUMERIC", 'name': 'k_5'},
+                             {'mode': 'NULLABLE', 'type': "TIMESTAMP", 'name': 'k_6'},
+                             {'mode': 'NULLABLE', 'type': "NUMERIC", 'name': 'k_7'}]
+@pytest.mark.parametrize("value, expected_result", [(0, "INTEGER"), (-2 ** 63, "INTEGER"), (2 ** 63 - 1, "INTEGER"),
+                                                    (2 ** 63, "NUMERIC"), (-10 ** 29 + 1, "NUMERIC"),
+                                                    (10 ** 29, "FLOAT")])
+def test_classify_integer(value, expected_result):
+    assert classify_integer(value) == expected_result
+
+# the second record has the shape of the first, so it is a hit of the shape cache
+value_detect_types_3 = [{"k_1": 1}, {"k_1": 2 ** 64},
+                        {"k_2": [1, 2], "k_3": [None, 2 ** 64], "k_4": [1, "2", 10 ** 30]}]
+expected_r_detect_types_3 = [{'mode': 'NULLABLE', 'type': "NUMERIC", 'name': 'k_1'},
+                             {'mode': 'REPEATED', 'type': "INTEGER", 'name': 'k_2'},
+                             {'mode': 'REPEATED', 'type': "NUMERIC", 'name': 'k_3'},
+                             {'mode': 'REPEATED', 'type': "FLOAT", 'name': 'k_4'}]
+
+value_detect_types_2 = [{"k_1": 1}, {"k_1": 1.5}, {"k_2": "12"}, {"k_2": True}, {"k_3": "2020-01-31"}, {"k_3": 1},
+                        {"k_4": "1.5"}, {"k_4": "0.30000000000000004"}, {"k_4": "12"}]
+expected_r_detect_types_2 = [{'mode': 'NULLABLE', 'type': "FLOAT", 'name': 'k_1'},
+                             {'mode': 'NULLABLE', 'type': "STRING", 'name': 'k_2'},
+                             {'mode': 'NULLABLE', 'type': "STRING", 'name': 'k_3'},
+                             {'mode': 'NULLABLE', 'type': "FLOAT", 'name': 'k_4'}]
+
+@pytest.mark.parametrize("value, expected_result", [(value_detect_types_1, expected_r_detect_types_1),
+                                                    (value_detect_types_2, expected_r_detect_types_2),
+                                                    (value_detect_types_3, expected_r_detect_types_3)])
+@pytest.mark.parametrize("shape_cache_size", [0, 10])
+def test_detect_types(value, expected_result, shape_cache_size):
+    assert batch_to_bq_schema(value, detect_types=True, shape_cache_size=shape_cache_size) == expected_result
+
+def test_types_not_detected_by_default():
+    assert batch_to_bq_schema([{"k_1": 1, "k_2": "12"}]) == [{'mode': 'NULLABLE', 'type': "FLOAT", 'name': 'k_1'},
+                                                             {'mode': 'NULLABLE', 'type': "STRING", 'name': 'k_2'}]
+
+def _classify_unexpectedly(value):
+    raise AssertionError(f"classified {value!r}")
+
+def test_string_columns_are_not_classified():
+    schema_generator = SchemaGenerator(detect_types=True)
+    schema_generator.update_schema_columns([{"k_1": "text"}])
+    schema_generator.update_from_columns({"k_2": ["text", None]})
+    assert schema_generator._root.children["k_1"].saturated and schema_generator._root.children["k_2"].saturated
+    schema_generator._classify = _classify_unexpectedly
+    schema_generator.update_schema_columns([{"k_1": "12", "k_2": "12"}])
+    schema_generator.update_from_columns({"k_1": ["12", "2020-01-31"], "k_2": ["true", None]})
+    assert [(field["name"], field["type"]) for field in schema_generator.get_bq_schema()] == \
+        [("k_1", "STRING"), ("k_2", "STRING")]
+    # columns that are not saturated are still classified
+    with pytest.raises(AssertionError, match="classified '12'"):
+        schema_generator.update_from_columns({"k_3": ["12"]})
+
+def test_detect_types_from_files_and_columns():
+    schema_generator = SchemaGenerator(detect_types=True)
+    schema_generator.update_from_ndjson(io.BytesIO(b'{"k_1": "12", "k_2": "2020-01-31", "k_3": "' + b"x" * 100
+                                                   + b'"}\n'))
+    schema_generator.update_from_csv(io.BytesIO(b"k_4,k_5\n1,true\n"))
+    schema_generator.update_from_columns({"k_6": array.array("q", [1]), "k_7": ["1", None]})
+    assert [(field["name"], field["type"]) for field in schema_generator.get_bq_schema()] == \
+        [("k_1", "INTEGER"), ("k_2", "DATE"), ("k_3", "STRING"), ("k_4", "INTEGER"), ("k_5", "BOOLEAN"),
+         ("k_6", "INTEGER"), ("k_7", "INTEGER")]
+
+def test_skeletonize_keeps_short_strings():
+    assert _skeletonize(b'{"k_1": "12", "k_2": "some long text"}', 2) == b'{"k_1": "12", "k_2": ""}'
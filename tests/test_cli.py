@@ -0,0 +1,53 @@
+import gzip
+import json
+import pytest
+from bq_schema_generator.cli import main
+
+
+value_cli_ndjson_1 = [{"k_1": 1, "k_2": {"kk_1": "a"}}, {"k_1": "a", "k_3": [True]}]
+value_cli_csv_1 = b"k_1,k_4\n1,\n2,b\n"
+expected_r_cli_1 = [{'mode': 'NULLABLE', 'type': "STRING", 'name': 'k_1'},
+                    {'mode': 'NULLABLE', 'type': "RECORD", 'name': 'k_2', 'fields':
+                     [{'mode': 'NULLABLE', 'type': "STRING", 'name': 'kk_1'}]},
+                    {'mode': 'REPEATED', 'type': "BOOLEAN", 'name': 'k_3'},
+                    {'mode': 'NULLABLE', 'type': "INTEGER", 'name': 'k_4'}]
+
+@pytest.fixture
+def files(tmp_path):
+    with gzip.open(tmp_path / "export-000.json.gz", "wt") as f:
+        f.write("\n".join(json.dumps(record) for record in value_cli_ndjson_1))
+    (tmp_path / "export-001.csv").write_bytes(value_cli_csv_1)
+    return tmp_path
+
+@pytest.mark.parametrize("workers", ["1", "2"])
+def test_cli(files, workers, capsys):
+    assert main([str(files / "export-*"), "--workers", workers, "--default-types", "k_4=integer"]) == 0
+    out, err = capsys.readouterr()
+    assert json.loads(out) == expected_r_cli_1
+    assert "[2/2]" in err
+
+def test_cli_max_rows(files, capsys):
+    assert main([str(files / "*.json.gz"), "--max-rows", "1", "--quiet"]) == 0
+    out, err = capsys.readouterr()
+    assert [field["name"] for field in json.loads(out)] == ["k_1", "k_2"]
+    assert err == ""
+
+@pytest.mark.parametrize("paths, options, expected_error", [
+    (["nothing-*.json"], [], "no files match"),
+    (["*.json.gz"], ["--default-types", "k_1"], "expected NAME=TYPE"),
+    (["*.json.gz"], ["--sample", "2"], "--sample should be in"),
+    (["missing.json"], [], "no such file"),
+    (["*.json.gz", "missing.json"], [], "no such file"),
+    (["*.json.gz", "nothing-*.json"], [], "no files match")])
+def test_cli_usage_errors(files, paths, options, expected_error, capsys):
+    with pytest.raises(SystemExit) as e:
+        main([str(files / path) for path in paths] + options)
+    assert e.value.code == 2
+    assert expected_error in capsys.readouterr().err
+
+@pytest.mark.parametrize("workers", ["1", "2"])
+def test_cli_detect_types(files, workers, capsys):
+    assert main([str(files / "*.csv"), "--workers", workers, "--detect-types", "--quiet"]) == 0
+    out, _ = capsys.readouterr()
+    assert json.loads(out) == [{'mode': 'NULLABLE', 'type': "INTEGER", 'name': 'k_1'},
+                               {'mode': 'NULLABLE', 'type': "STRING", 'name': 'k_4'}]
@@ -0,0 +1,114 @@
+import array
+import datetime
+import pytest
+from bq_schema_generator.columnar import iter_table_columns
+from bq_schema_generator.schema_generator import SchemaGenerator
+
+
+value_columns_1 = {"k_1": array.array("d", [1.5, 2.0]),
+                   "k_2": array.array("q", []),
+                   "k_3": [True, None, False],
+                   "k_4": ["a", float("nan"), None],
+                   "k_5": [None, float("nan")]}
+expected_r_columns_1 = [("k_1", "FLOAT", None), ("k_2", "NULL", None), ("k_3", None, value_columns_1["k_3"]),
+                        ("k_4", None, value_columns_1["k_4"]), ("k_5", None, value_columns_1["k_5"])]
+
+@pytest.mark.parametrize("value, expected_result", [(value_columns_1, expected_r_columns_1)])
+def test_iter_table_columns(value, expected_result):
+    assert list(iter_table_columns(value)) == expected_result
+
+value_update_from_columns_1 = {"k_1": array.array("i", [1, 2]),
+                               "k_2": [True, None, 1.5],
+                               "k_3": ["a", float("nan"), None],
+                               "k_4": [None, float("nan")],
+                               "k_5": [{"kk_1": 1}, None, {"kk_2": "a"}]}
+expected_r_update_from_columns_1 = [{'mode': 'NULLABLE', 'type': "FLOAT", 'name': 'k_1'},
+                                    {'mode': 'NULLABLE', 'type': "STRING", 'name': 'k_2'},
+                                    {'mode': 'NULLABLE', 'type': "STRING", 'name': 'k_3'},
+                                    {'mode': 'NULLABLE', 'type': "RECORD", 'name': 'k_5', 'fields':
+                                        [{'mode': 'NULLABLE', 'type': "FLOAT", 'name': 'kk_1'},
+                                         {'mode': 'NULLABLE', 'type': "STRING", 'name': 'kk_2'}]}]
+
+@pytest.mark.parametrize("value, expected_result", [(value_update_from_columns_1, expected_r_update_from_columns_1)])
+def test_update_from_columns(value, expected_result):
+    schema_generator = SchemaGenerator()
+    schema_generator.update_from_columns(value)
+    assert schema_generator.get_bq_schema() == expected_result
+
+def test_update_from_columns_matches_records():
+    records = [{"k_1": 1, "k_2": "a"}, {"k_1": 2.5, "k_2": None}]
+    schema_generator = SchemaGenerator()
+    schema_generator.update_from_columns({"k_1": [1, 2.5], "k_2": ["a", None]})
+    records_generator = SchemaGenerator()
+    records_generator.update_schema_columns(records)
+    assert schema_generator.get_bq_schema() == records_generator.get_bq_schema()
+
+@pytest.mark.parametrize("detect_types, expected_result", [
+    (False, [{'mode': 'NULLABLE', 'type': "FLOAT", 'name': 'k_1'},
+             {'mode': 'NULLABLE', 'type': "STRING", 'name': 'k_2'},
+             {'mode': 'NULLABLE', 'type': "STRING", 'name': 'k_3'}]),
+    (True, [{'mode': 'NULLABLE', 'type': "INTEGER", 'name': 'k_1'},
+            {'mode': 'NULLABLE', 'type': "TIMESTAMP", 'name': 'k_2'},
+            {'mode': 'NULLABLE', 'type': "STRING", 'name': 'k_3'}])])
+def test_update_from_pandas(detect_types, expected_result):
+    pd = pytest.importorskip("pandas")
+    table = pd.DataFrame({"k_1": pd.array([1, None], dtype="Int64"),
+                          "k_2": pd.to_datetime(["2020-01-01 10:00:00", None]),
+                          "k_3": ["a", float("nan")],
+                          "k_4": pd.array([None, None], dtype="Int64")})
+    schema_generator = SchemaGenerator(detect_types=detect_types)
+    schema_generator.update_from_columns(table)
+    assert schema_generator.get_bq_schema() == expected_result
+
+@pytest.mark.parametrize("detect_types, expected_result", [
+    (False, [{'mode': 'NULLABLE', 'type': "FLOAT", 'name': 'k_1'},
+             {'mode': 'NULLABLE', 'type': "STRING", 'name': 'k_2'},
+             {'mode': 'NULLABLE', 'type': "STRING", 'name': 'k_3'},
+             {'mode': 'NULLABLE', 'type': "STRING", 'name': 'k_4'},
+             {'mode': 'NULLABLE', 'type': "RECORD", 'name': 'k_5', 'fields':
+                 [{'mode': 'NULLABLE', 'type': "FLOAT", 'name': 'kk_1'}]}]),
+    (True, [{'mode': 'NULLABLE', 'type': "INTEGER", 'name': 'k_1'},
+            {'mode': 'NULLABLE', 'type': "TIMESTAMP", 'name': 'k_2'},
+            {'mode': 'NULLABLE', 'type': "DATE", 'name': 'k_3'},
+            {'mode': 'NULLABLE', 'type': "STRING", 'name': 'k_4'},
+            {'mode': 'NULLABLE', 'type': "RECORD", 'name': 'k_5', 'fields':
+                [{'mode': 'NULLABLE', 'type': "INTEGER", 'name': 'kk_1'}]}])])
+def test_update_from_arrow(detect_types, expected_result):
+    pa = pytest.importorskip("pyarrow")
+    table = pa.table({"k_1": pa.array([1, None], pa.int64()),
+                      "k_2": pa.array([datetime.datetime(2020, 1, 1, 10), None], pa.timestamp("us")),
+                      "k_3": pa.array([datetime.date(2020, 1, 1), None], pa.date32()),
+                      "k_4": pa.array(["a", None], pa.string()),
+                      "k_5": pa.array([{"kk_1": 1}, None], pa.struct([("kk_1", pa.int64())])),
+                      "k_6": pa.array([None, None], pa.int64())})
+    schema_generator = SchemaGenerator(detect_types=detect_types)
+    schema_generator.update_from_columns(table)
+    assert schema_generator.get_bq_schema() == expected_result
+
+@pytest.mark.parametrize("arrow_type", ["binary", "large_binary"])
+def test_update_from_arrow_binary(arrow_type):
+    pa = pytest.importorskip("pyarrow")
+    table = pa.table({"k_1": pa.array([b"a", None], getattr(pa, arrow_type)())})
+    with pytest.raises(Exception, match=f"Unsupported arrow datatype: {arrow_type}, for column: k_1"):
+        SchemaGenerator().update_from_columns(table)
+
+def test_update_from_pandas_nullable_objects():
+    pd = pytest.importorskip("pandas")
+    table = pd.DataFrame({"k_1": ["a", None], "k_2": [1.5, None], "k_3": [{"kk_1": True}, None]}).convert_dtypes()
+    table["k_4"] = pd.array(["b", None], dtype="string")
+    schema_generator = SchemaGenerator()
+    schema_generator.update_from_columns(table)
+    assert schema_generator.get_bq_schema() == [{'mode': 'NULLABLE', 'type': "STRING", 'name': 'k_1'},
+                                                {'mode': 'NULLABLE', 'type': "FLOAT", 'name': 'k_2'},
+                                                {'mode': 'NULLABLE', 'type': "RECORD", 'name': 'k_3', 'fields':
+                                                    [{'mode': 'NULLABLE', 'type': "BOOLEAN", 'name': 'kk_1'}]},
+                                                {'mode': 'NULLABLE', 'type': "STRING", 'name': 'k_4'}]
+
+def test_update_from_columns_unnamed():
+    with pytest.raises(Exception, match="Column names should be strings, got: 0"):
+        SchemaGenerator().update_from_columns({0: [1], 1: ["a"]})
+
+def test_update_from_pandas_unnamed():
+    pd = pytest.importorskip("pandas")
+    with pytest.raises(Exception, match="Column names should be strings, got: 0"):
+        SchemaGenerator().update_from_columns(pd.DataFrame([[1, "a"]]))
@@ -0,0 +1,82 @@
+import gzip
+import io
+import json
+import os
+import pytest
+from bq_schema_generator.readers import _skeletonize, iter_csv, iter_ndjson
+from bq_schema_generator.schema_generator import SchemaGenerator
+
+
+records = [{"k_1": 10, "k_2": "test"}, {"k_1": 1.5, "k_3": {"kk_1": True}}, {"k_2": "a\nb"}]
+ndjson = "\n".join(json.dumps(record) for record in records).encode("utf-8") + b"\n\n"
+csv_data = b"k_1,k_2\n10,test\n,\"a\nb\"\n"
+
+@pytest.mark.parametrize("compress, use_mmap, chunk_size", [(False, False, 1 << 20),
+                                                            (False, True, 1 << 20),
+                                                            (True, False, 1 << 20),
+                                                            (False, False, 7)])
+def test_iter_ndjson(tmp_path, compress, use_mmap, chunk_size):
+    path = tmp_path / "records.json"
+    path.write_bytes(gzip.compress(ndjson) if compress else ndjson)
+    assert list(iter_ndjson(path, chunk_size, use_mmap)) == records
+
+def test_iter_ndjson_fileobj():
+    fileobj = io.BytesIO(ndjson)
+    assert list(iter_ndjson(fileobj)) == records
+    assert not fileobj.closed
+
+def test_iter_gzip_fileobj():
+    fileobj = io.BytesIO(gzip.compress(ndjson))
+    assert list(iter_ndjson(fileobj)) == records
+    assert list(iter_csv(io.BytesIO(gzip.compress(csv_data)))) == [{"k_1": "10", "k_2": "test"},
+                                                                   {"k_1": None, "k_2": "a\nb"}]
+    read_fd, write_fd = os.pipe()
+    with open(write_fd, "wb") as writer:
+        writer.write(gzip.compress(ndjson))
+    with open(read_fd, "rb", buffering=0) as pipe:
+        assert list(iter_ndjson(pipe)) == records
+
+@pytest.mark.parametrize("value", [b'{"k_1": 1}\n{"k_1": \n', b'{"k_1": 1}, {"k_2": 2}\n', b'{"k_1": [1\n2]}\n'])
+def test_iter_ndjson_invalid_line(value):
+    with pytest.raises(json.JSONDecodeError):
+        list(iter_ndjson(io.BytesIO(value)))
+
+@pytest.mark.parametrize("compress, use_mmap", [(False, False), (False, True), (True, False)])
+def test_iter_csv(tmp_path, compress, use_mmap):
+    path = tmp_path / "records.csv"
+    path.write_bytes(gzip.compress(csv_data) if compress else csv_data)
+    assert list(iter_csv(path, use_mmap=use_mmap)) == [{"k_1": "10", "k_2": "test"}, {"k_1": None, "k_2": "a\nb"}]
+
+def test_update_from_files(tmp_path):
+    path = tmp_path / "records.json.gz"
+    path.write_bytes(gzip.compress(ndjson))
+    schema_generator = SchemaGenerator()
+    schema_generator.update_from_ndjson(str(path))
+    schema_generator.update_from_csv(io.BytesIO(csv_data))
+    assert schema_generator.get_bq_schema() == [{'mode': 'NULLABLE', 'type': "STRING", 'name': 'k_1'},
+                                                {'mode': 'NULLABLE', 'type': "STRING", 'name': 'k_2'},
+                                                {'mode': 'NULLABLE', 'type': "RECORD", 'name': 'k_3', 'fields':
+                                                    [{'mode': 'NULLABLE', 'type': "BOOLEAN", 'name': 'kk_1'}]}]
+
+@pytest.mark.parametrize("value, expected_result", [(b'{"k_1": "text", "k_2" : ["a", "b"], "k_3": {"kk_1": "c"}}',
+                                                     b'{"k_1": "", "k_2" : ["", ""], "k_3": {"kk_1": ""}}'),
+                                                    (b'{"k_1": "a \\"quoted\\" text"}',
+                                                     b'{"k_1": "a \\"quoted\\" text"}'),
+                                                    (b'{"k_1": 1.5, "k_2": null}',
+                                                     b'{"k_1": 1.5, "k_2": null}')])
+def test_skeletonize(value, expected_result):
+    assert _skeletonize(value) == expected_result
+
+def test_iter_ndjson_schema_only():
+    schema_only_records = list(iter_ndjson(io.BytesIO(ndjson), schema_only=True))
+    assert schema_only_records == [{"k_1": 10, "k_2": ""}, {"k_1": 1.5, "k_3": {"kk_1": True}}, {"k_2": ""}]
+
+@pytest.mark.parametrize("detect_types", [False, True])
+def test_update_from_ndjson_schema_only(detect_types):
+    data = b'{"k_1": "10", "k_2": "' + b"caf\\u00e9 au lait, " * 3 + b'", "k_3": ["2020-01-01"]}\n'
+    schemas = []
+    for schema_only in (False, True):
+        schema_generator = SchemaGenerator(detect_types=detect_types)
+        schema_generator.update_from_ndjson(io.BytesIO(data), schema_only=schema_only)
+        schemas.append(schema_generator.get_bq_schema())
+    assert schemas[0] == schemas[1]
@@ -0,0 +1,46 @@
+import itertools
+import pytest
+from bq_schema_generator import batch_to_bq_schema
+from bq_schema_generator.schema_generator import InferenceInfo, SchemaGenerator
+
+
+value_sampling_1 = [{"k_1": i, "k_2": {"kk_1": "a"}} for i in range(1000)]
+expected_r_sampling_1 = [{'mode': 'NULLABLE', 'type': "FLOAT", 'name': 'k_1'},
+                         {'mode': 'NULLABLE', 'type': "RECORD", 'name': 'k_2', 'fields':
+                          [{'mode': 'NULLABLE', 'type': "STRING", 'name': 'kk_1'}]}]
+
+@pytest.mark.parametrize("value, expected_result", [(value_sampling_1, expected_r_sampling_1)])
+def test_exhaustive_by_default(value, expected_result):
+    schema, info = batch_to_bq_schema(value, with_info=True)
+    assert schema == expected_result
+    assert info == InferenceInfo(1000, 1000, False)
+
+@pytest.mark.parametrize("value, expected_result", [(value_sampling_1, expected_r_sampling_1)])
+def test_bernoulli_sampling(value, expected_result):
+    schema, info = batch_to_bq_schema(value, with_info=True, record_sampling="bernoulli", record_sample_rate=0.1,
+                                      record_sample_seed=1)
+    assert schema == expected_result
+    assert info.rows_seen == 1000 and 50 < info.rows_examined < 150
+
+@pytest.mark.parametrize("value, expected_result", [(value_sampling_1, expected_r_sampling_1)])
+def test_reservoir_sampling(value, expected_result):
+    schema_generator = SchemaGenerator(record_sampling="reservoir", record_sample_size=10, record_sample_seed=1)
+    schema_generator.update_schema_columns(value)
+    assert schema_generator.get_bq_schema() == expected_result
+    assert schema_generator.inference_info() == InferenceInfo(1000, 10, False)
+
+def test_stop_after_unchanged():
+    records = ({"k_1": i} if i < 5 else {"k_1": i, "k_2": "a"} for i in itertools.count())
+    schema_generator = SchemaGenerator(stop_after_unchanged=100)
+    # the records are not pulled anymore once the schema converged
+    schema_generator.update_schema_columns(records)
+    assert schema_generator.inference_info() == InferenceInfo(106, 106, True)
+    assert [field["name"] for field in schema_generator.get_bq_schema()] == ["k_1", "k_2"]
+    schema_generator.update_schema_columns([{"k_3": 1}])
+    assert len(schema_generator.get_bq_schema()) == 2
+
+@pytest.mark.parametrize("value", [{"record_sampling": "first"}, {"record_sample_rate": 0},
+                                   {"record_sampling": "reservoir", "stop_after_unchanged": 10}])
+def test_sampling_options_exception(value):
+    with pytest.raises(Exception):
+        SchemaGenerator(**value)
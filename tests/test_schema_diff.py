@@ -0,0 +1,142 @@
+import copy
+import pytest
+from bq_schema_generator.schema_generator import SchemaChange, SchemaGenerator
+from bq_schema_generator.type_lattice import TypeLattice
+
+
+value_seed_schema_1 = [{'mode': 'REQUIRED', 'type': "STRING", 'name': 'k_1'},
+                       {'mode': 'NULLABLE', 'type': "FLOAT64", 'name': 'k_2'},
+                       {'mode': 'NULLABLE', 'type': "RECORD", 'name': 'k_3', 'fields':
+                        [{'mode': 'REQUIRED', 'type': "BOOLEAN", 'name': 'kk_1'},
+                         {'type': "TIMESTAMP", 'name': 'kk_2'}]}]
+value_seed_records_1 = [{"k_1": "a", "k_2": "b", "k_3": {"kk_1": True, "kk_2": "2020-01-01", "kk_3": 1.5}},
+                        {"k_1": "a", "k_2": [1.5], "k_3": {"kk_2": 1}, "k_4": {"kk_1": 1}}]
+expected_r_seed_schema_1 = [{'mode': 'REQUIRED', 'type': "STRING", 'name': 'k_1'},
+                            {'mode': 'NULLABLE', 'type': "FLOAT", 'name': 'k_2'},
+                            {'mode': 'NULLABLE', 'type': "RECORD", 'name': 'k_3', 'fields':
+                             [{'mode': 'NULLABLE', 'type': "BOOLEAN", 'name': 'kk_1'},
+                              {'mode': 'NULLABLE', 'type': "TIMESTAMP", 'name': 'kk_2'},
+                              {'mode': 'NULLABLE', 'type': "FLOAT", 'name': 'kk_3'}]},
+                            {'mode': 'NULLABLE', 'type': "RECORD", 'name': 'k_4', 'fields':
+                             [{'mode': 'NULLABLE', 'type': "INTEGER", 'name': 'kk_1'}]}]
+expected_r_seed_diff_1 = [SchemaChange("k_2", "type", "FLOAT", "STRING", False),
+                          SchemaChange("k_2", "mode", "NULLABLE", "REPEATED", False),
+                          SchemaChange("k_3.kk_1", "mode", "REQUIRED", "NULLABLE", True),
+                          SchemaChange("k_3.kk_2", "type", "TIMESTAMP", "STRING", False),
+                          SchemaChange("k_3.kk_3", "added", None, "FLOAT", True),
+                          SchemaChange("k_4", "added", None, "RECORD", True),
+                          SchemaChange("k_4.kk_1", "added", None, "INTEGER", True)]
+
+value_seed_schema_2 = [{'mode': 'NULLABLE', 'type': "INTEGER", 'name': 'k_1'},
+                       {'mode': 'NULLABLE', 'type': "TIMESTAMP", 'name': 'k_2'},
+                       {'mode': 'NULLABLE', 'type': "BYTES", 'name': 'k_3'}]
+expected_r_seed_schema_2 = [{'mode': 'NULLABLE', 'type': "INTEGER", 'name': 'k_1'},
+                            {'mode': 'NULLABLE', 'type': "TIMESTAMP", 'name': 'k_2'},
+                            {'mode': 'NULLABLE', 'type': "BYTES", 'name': 'k_3'}]
+value_seed_records_2 = [{"k_1": 1, "k_2": "2020-01-01 10:00:00", "k_3": None}]
+value_seed_records_3 = [{"k_1": "not-a-number", "k_2": {"kk_1": 1}, "k_3": "a"}]
+expected_r_seed_diff_3 = [SchemaChange("k_1", "type", "INTEGER", "STRING", False),
+                          SchemaChange("k_2", "type", "TIMESTAMP", "RECORD", False),
+                          SchemaChange("k_3", "type", "BYTES", "STRING", False)]
+value_seed_records_4 = [{"k_1": 2.5, "k_2": True}]
+expected_r_seed_diff_4 = [SchemaChange("k_1", "type", "INTEGER", "FLOAT", False),
+                          SchemaChange("k_2", "type", "TIMESTAMP", "STRING", False)]
+
+@pytest.mark.parametrize("value_seed_schema, value_records, expected_schema, expected_diff",
+                         [(value_seed_schema_1, value_seed_records_1, expected_r_seed_schema_1,
+                           expected_r_seed_diff_1),
+                          (value_seed_schema_2, value_seed_records_2, expected_r_seed_schema_2, []),
+                          (value_seed_schema_2, value_seed_records_3, expected_r_seed_schema_2,
+                           expected_r_seed_diff_3),
+                          (value_seed_schema_2, value_seed_records_4, expected_r_seed_schema_2,
+                           expected_r_seed_diff_4)])
+def test_seed_bq_schema(value_seed_schema, value_records, expected_schema, expected_diff):
+    seed_schema = copy.deepcopy(value_seed_schema)
+    schema_generator = SchemaGenerator(seed_schema=seed_schema, detect_types=True)
+    assert seed_schema == value_seed_schema
+    schema_generator.update_schema_columns(value_records)
+    assert schema_generator.get_bq_schema() == expected_schema
+    assert schema_generator.schema_diff() == expected_diff
+
+def test_seeded_columns_are_saturated():
+    schema_generator = SchemaGenerator(seed_schema=[{'mode': 'NULLABLE', 'type': "STRING", 'name': 'k_1'}])
+    assert schema_generator._root.children["k_1"].saturated
+    schema_generator.update_schema_columns([{"k_1": 1.5}])
+    assert schema_generator.schema_diff() == []
+
+def test_seed_roundtrip():
+    schema_generator = SchemaGenerator()
+    schema_generator.update_schema_columns(value_seed_records_1)
+    seeded_generator = SchemaGenerator(seed_schema=schema_generator.get_bq_schema())
+    seeded_generator.update_schema_columns(value_seed_records_1)
+    assert seeded_generator.get_bq_schema() == schema_generator.get_bq_schema()
+    assert seeded_generator.schema_diff() == []
+
+def test_seeded_incomparable_types():
+    type_lattice = TypeLattice({"BOOLEAN": [], "FLOAT": ["STRING"], "STRING": [], "RECORD": []})
+    schema_generator = SchemaGenerator(type_lattice=type_lattice,
+                                       seed_schema=[{'mode': 'NULLABLE', 'type': "STRING", 'name': 'k_1'}])
+    # STRING has no common type with BOOLEAN, so it cannot be saturated
+    assert not schema_generator._root.children["k_1"].saturated
+    schema_generator.update_schema_columns([{"k_1": 1.5}, {"k_1": True}])
+    assert schema_generator.get_bq_schema() == [{'mode': 'NULLABLE', 'type': "STRING", 'name': 'k_1'}]
+    assert schema_generator.schema_diff() == [SchemaChange("k_1", "type", "STRING", "BOOLEAN", False)]
+
+value_seed_schema_3 = [{'mode': 'REQUIRED', 'type': "STRING", 'name': 'k_1'},
+                       {'mode': 'REQUIRED', 'type': "FLOAT", 'name': 'k_2'},
+                       {'mode': 'REQUIRED', 'type': "RECORD", 'name': 'k_3', 'fields':
+                        [{'mode': 'REQUIRED', 'type': "BOOLEAN", 'name': 'kk_1'}]}]
+
+@pytest.mark.parametrize("value, expected_result", [({"k_1": ["a", None], "k_2": [1.5, 2.5]}, ["k_1", "k_3"]),
+                                                    ({"k_1": ["a"], "k_2": [float("nan")], "k_3": [{"kk_1": True}]},
+                                                     ["k_2"]),
+                                                    ({"k_1": [], "k_2": []}, [])])
+def test_update_from_columns_relaxes_required(value, expected_result):
+    schema_generator = SchemaGenerator(seed_schema=value_seed_schema_3)
+    schema_generator.update_from_columns(value)
+    assert [change.name for change in schema_generator.schema_diff()] == expected_result
+    assert all(change == SchemaChange(change.name, "mode", "REQUIRED", "NULLABLE", True)
+               for change in schema_generator.schema_diff())
+
+@pytest.mark.parametrize("value, expected_result", [([{"k_1": "a", "k_2": 1.5, "k_3": {"kk_1": True}}], []),
+                                                    ([{"k_1": "a", "k_3": {"kk_2": 1.5}}],
+                                                     ["k_2", "k_3.kk_1", "k_3.kk_2"]),
+                                                    ([], [])])
+def test_merge_relaxes_required(value, expected_result):
+    other = SchemaGenerator()
+    other.update_schema_columns(value)
+    schema_generator = SchemaGenerator(seed_schema=value_seed_schema_3).merge(other)
+    assert [change.name for change in schema_generator.schema_diff()] == expected_result
+    serial = SchemaGenerator(seed_schema=value_seed_schema_3)
+    serial.update_schema_columns(value)
+    assert schema_generator.schema_diff() == serial.schema_diff()
+
+def test_merge_seeded_shards():
+    shards = [[{"k_1": "a", "k_2": 1.5, "k_3": {"kk_1": True}}], [{"k_1": "b", "k_2": None, "k_3": {"kk_1": False}}]]
+    schema_generators = []
+    for shard in shards:
+        schema_generators.append(SchemaGenerator(seed_schema=value_seed_schema_3))
+        schema_generators[-1].update_schema_columns(shard)
+    merged = schema_generators[0].merge(schema_generators[1])
+    serial = SchemaGenerator(seed_schema=value_seed_schema_3)
+    serial.update_schema_columns(shards[0] + shards[1])
+    assert merged.get_bq_schema() == serial.get_bq_schema()
+    assert merged.schema_diff() == serial.schema_diff() == [SchemaChange("k_2", "mode", "REQUIRED", "NULLABLE", True)]
+
+def test_seed_undetected_types():
+    with pytest.raises(Exception, match=r"Seeded types \['INTEGER', 'TIMESTAMP'\] are not inferred"):
+        SchemaGenerator(seed_schema=value_seed_schema_2)
+
+def test_seed_does_not_change_shared_lattice():
+    type_lattice = TypeLattice({"BOOLEAN": ["STRING"], "FLOAT": ["STRING"], "STRING": ["RECORD"], "RECORD": []})
+    schema_generator = SchemaGenerator(type_lattice=type_lattice,
+                                       seed_schema=[{'mode': 'NULLABLE', 'type': "BYTES", 'name': 'k_1'}])
+    assert "BYTES" not in type_lattice.codes
+    schema_generator.update_schema_columns([{"k_1": "a"}])
+    assert schema_generator.schema_diff() == [SchemaChange("k_1", "type", "BYTES", "STRING", False)]
+
+def test_pruned_records_are_not_reported():
+    schema_generator = SchemaGenerator(seed_schema=[{'mode': 'NULLABLE', 'type': "STRING", 'name': 'k_1'}])
+    schema_generator.update_schema_columns([{"k_2": [{}]}, {"k_3": {"kk_1": [{}]}}, {"k_4": {"kk_1": [{}], "kk_2": 1}}])
+    assert schema_generator.schema_diff() == [SchemaChange("k_4", "added", None, "RECORD", True),
+                                              SchemaChange("k_4.kk_2", "added", None, "FLOAT", True)]
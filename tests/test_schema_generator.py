@@ -1,7 +1,9 @@
+import functools
 import pytest
 import json
 from bq_schema_generator.schema_generator import SchemaGenerator
-from bq_schema_generator import batch_to_bq_schema
+from bq_schema_generator.type_lattice import TypeLattice
+from bq_schema_generator import batch_to_bq_schema, infer_parallel
 
 
 schema_generator = SchemaGenerator()
@@ -311,3 +313,252 @@ expected_r_batch_to_bq_schema_2 = test_values["expected_r_batch_to_bq_schema_2"]
                                                     (value_batch_to_bq_schema_2, expected_r_batch_to_bq_schema_2)])
 def test_batch_to_bq_schema(value, expected_result):
     assert batch_to_bq_schema(value) == expected_result
+
+"""
+TEST column tree
+"""
+
+value_column_tree_1 = [{"k_1": {"kk_1": "test"}}, {"k_1": {"kk_1": 10}}]
+expected_r_column_tree_1 = [{'mode': 'NULLABLE', 'type': "RECORD", 'name': 'k_1', 'fields':
+                             [{'mode': 'NULLABLE', 'type': "STRING", 'name': 'kk_1'}]}]
+
+value_column_tree_2 = [{"k_1.kk_1": 10, "k_1": {"kk_1": "test"}}]
+expected_r_column_tree_2 = [{'mode': 'NULLABLE', 'type': "FLOAT", 'name': 'k_1.kk_1'},
+                            {'mode': 'NULLABLE', 'type': "RECORD", 'name': 'k_1', 'fields':
+                             [{'mode': 'NULLABLE', 'type': "STRING", 'name': 'kk_1'}]}]
+
+@pytest.mark.parametrize("value, expected_result", [(value_column_tree_1, expected_r_column_tree_1),
+                                                    (value_column_tree_2, expected_r_column_tree_2)])
+def test_column_tree(value, expected_result):
+    assert batch_to_bq_schema(value) == expected_result
+
+"""
+TEST saturated columns
+"""
+
+value_saturated_1 = [{"k_1": "test", "k_2": {"kk_1": "a"}},
+                     {"k_1": 10, "k_2": {"kk_1": 1, "kk_2": True}},
+                     {"k_1": {"kk_1": 10}, "k_2": {"kk_1": "b"}}]
+expected_r_saturated_1 = [{'mode': 'NULLABLE', 'type': "RECORD", 'name': 'k_1', 'fields':
+                           [{'mode': 'NULLABLE', 'type': "FLOAT", 'name': 'kk_1'}]},
+                          {'mode': 'NULLABLE', 'type': "RECORD", 'name': 'k_2', 'fields':
+                           [{'mode': 'NULLABLE', 'type': "STRING", 'name': 'kk_1'},
+                            {'mode': 'NULLABLE', 'type': "BOOLEAN", 'name': 'kk_2'}]}]
+
+value_saturated_2 = [{"k_1": [{"kk_1": "a"}, {"kk_1": "b"}, {"kk_1": "c", "kk_2": 1}]}]
+expected_r_saturated_2 = [{'mode': 'REPEATED', 'type': "RECORD", 'name': 'k_1', 'fields':
+                           [{'mode': 'NULLABLE', 'type': "STRING", 'name': 'kk_1'},
+                            {'mode': 'NULLABLE', 'type': "FLOAT", 'name': 'kk_2'}]}]
+
+@pytest.mark.parametrize("value, expected_result", [(value_saturated_1, expected_r_saturated_1),
+                                                    (value_saturated_2, expected_r_saturated_2)])
+def test_saturated_columns(value, expected_result):
+    assert batch_to_bq_schema(value) == expected_result
+
+def test_saturation_tracking():
+    schema_generator = SchemaGenerator()
+    schema_generator.update_schema_columns([{"k_1": {"kk_1": "a", "kk_2": 1}}])
+    k_1 = schema_generator._root.children["k_1"]
+    assert k_1.saturated and not k_1.children["kk_2"].saturated
+    assert k_1.unsaturated_children == 1
+    schema_generator.update_schema_columns([{"k_1": {"kk_2": "b"}}])
+    assert k_1.unsaturated_children == 0
+
+def test_compact_column_nodes():
+    schema_generator = SchemaGenerator()
+    schema_generator.update_schema_columns([{"k_1": {"kk_1": [1, 2]}}, {"k_2": {"kk_1": True}}])
+    kk_1 = schema_generator._root.children["k_1"].children["kk_1"]
+    assert not hasattr(kk_1, "__dict__")
+    assert (kk_1.type_code, kk_1.mode_code) == (schema_generator._type_lattice.code("FLOAT"), 2)
+    # names are interned, columns sharing a name share its string
+    assert kk_1.name is schema_generator._root.children["k_2"].children["kk_1"].name
+
+"""
+TEST merge
+"""
+
+value_merge_1 = [[{"k_1": True, "k_2": {"kk_1": 1}}],
+                 [{"k_1": 1.5, "k_3": "test"}, {"k_2": {"kk_1": "a", "kk_2": [1, 2]}}],
+                 [{"k_2": [{"kk_2": 3}], "k_3": None}]]
+
+def test_merge_is_commutative():
+    schema_generators = []
+    for shard in value_merge_1:
+        schema_generators.append(SchemaGenerator())
+        schema_generators[-1].update_schema_columns(shard)
+    forward = SchemaGenerator().merge(schema_generators[0]).merge(schema_generators[1]).merge(schema_generators[2])
+    backward = SchemaGenerator().merge(schema_generators[2]).merge(schema_generators[1]).merge(schema_generators[0])
+    assert forward.schema_columns_dict == backward.schema_columns_dict
+
+def test_null_lists_are_skipped():
+    shards = [[{"k_1": [None], "k_2": {"kk_1": [None, None]}}], [{"k_1": [1, None], "k_2": {"kk_1": []}}]]
+    schema_generators = []
+    for shard in shards:
+        schema_generators.append(SchemaGenerator())
+        schema_generators[-1].update_schema_columns(shard)
+    assert schema_generators[0].get_bq_schema() == []
+    merged = SchemaGenerator().merge(schema_generators[0]).merge(schema_generators[1])
+    assert merged.get_bq_schema() == batch_to_bq_schema(shards[0] + shards[1])
+
+@pytest.mark.parametrize("value", [value_merge_1,
+                                   [value_batch_to_bq_schema_1[:2], value_batch_to_bq_schema_1[2:]]])
+def test_infer_parallel(value):
+    serial = batch_to_bq_schema([record for shard in value for record in shard])
+    assert infer_parallel(value, workers=2) == serial
+
+def _merge_shard(index):
+    return (record for record in value_merge_1[index])
+
+def test_infer_parallel_shards(tmp_path):
+    path = tmp_path / "shard-0.json"
+    path.write_text("\n".join(json.dumps(record) for record in value_merge_1[0]))
+    shards = [str(path), functools.partial(_merge_shard, 1), functools.partial(_merge_shard, 2)]
+    serial = batch_to_bq_schema([record for shard in value_merge_1 for record in shard], detect_types=True,
+                                max_depth=5)
+    assert infer_parallel(shards, workers=2, detect_types=True, max_depth=5) == serial
+    # options reach the generators of the workers
+    with pytest.raises(Exception, match="Maximum depth of 0 exceeded"):
+        infer_parallel(shards, workers=2, max_depth=0)
+
+"""
+TEST shape cache
+"""
+
+@pytest.mark.parametrize("value", [value_batch_schema_4, value_merge_1[1] + value_merge_1[2],
+                                   value_batch_to_bq_schema_1, value_batch_to_bq_schema_2])
+def test_shape_cache(value):
+    schema_generator = SchemaGenerator(shape_cache_size=2)
+    schema_generator.update_schema_columns(value + value)
+    assert schema_generator.get_bq_schema() == batch_to_bq_schema(value)
+
+def test_shape_cache_info():
+    schema_generator = SchemaGenerator(shape_cache_size=1)
+    schema_generator.update_schema_columns([{"k_1": 1}, {"k_1": 2}, {"k_1": "a"}, {"k_1": 3}])
+    assert schema_generator.shape_cache_info() == (1, 3, 1, 1)
+
+"""
+TEST get_bq_schema snapshots
+"""
+
+def test_get_bq_schema_mid_stream():
+    schema_generator = SchemaGenerator(default_column_types={"k_1": "INTEGER"})
+    schema_generator.update_schema_columns(value_batch_schema_3[:1])
+    first_schema = schema_generator.get_bq_schema()
+    assert schema_generator.get_bq_schema() is first_schema
+    schema_generator.update_schema_columns(value_batch_schema_3[1:])
+    second_schema = schema_generator.get_bq_schema()
+    assert len(first_schema[2]["fields"]) == 2
+    assert second_schema == [{'mode': 'NULLABLE', 'type': "INTEGER", 'name': 'k_1'},
+                             {'mode': 'NULLABLE', 'type': "BOOLEAN", 'name': 'k_2'},
+                             {'mode': 'NULLABLE', 'type': "RECORD", 'name': 'k_3', 'fields':
+                                 [{'mode': 'NULLABLE', 'type': "FLOAT", 'name': 'kk_1'},
+                                  {'mode': 'NULLABLE', 'type': "STRING", 'name': 'kk_2'},
+                                  {'mode': 'NULLABLE', 'type': "BOOLEAN", 'name': 'kk_3'}]}]
+    # unchanged columns are reused as is
+    assert second_schema[1] is first_schema[1]
+
+def test_get_bq_schema_is_immutable():
+    schema_generator = SchemaGenerator()
+    schema_generator.update_schema_columns(value_batch_schema_3)
+    schema = schema_generator.get_bq_schema()
+    with pytest.raises(TypeError):
+        schema.append({})
+    with pytest.raises(TypeError):
+        schema[2]["fields"][0]["type"] = "STRING"
+    assert json.loads(json.dumps(schema)) == schema
+
+def test_construct_bq_schema_deep_nesting():
+    depth = 1500
+    names = [".".join(f"k_{level}" for level in range(1, last + 1)) for last in range(1, depth + 1)]
+    value = {name: {'mode': 'NULLABLE', 'type': "RECORD", 'name': name.split(".")[-1]} for name in names}
+    value[names[-1]]["type"] = "STRING"
+    schema_generator = SchemaGenerator()
+    schema_generator._construct_bq_schema(value)
+    field, levels = schema_generator.bq_consumable_schema[0], 1
+    while "fields" in field:
+        field, levels = field["fields"][0], levels + 1
+    assert levels == depth and field["type"] == "STRING"
+
+def test_deeply_nested_records():
+    depth = 5000
+    record = {"k": "a"}
+    for _ in range(depth - 1):
+        record = {"k": record}
+    schema_generator = SchemaGenerator(collect_stats=True)
+    schema_generator.update_schema_columns([record, {"k": [record["k"], {"kk": 1}]}])
+    assert schema_generator.stats.max_depth == depth
+    assert len(schema_generator.schema_columns_dict) == depth + 1
+
+value_max_depth_1 = [{"k_1": {"kk_1": {"kkk_1": 1}, "kk_2": [{"kkk_1": 1}], "kk_3": 1}}]
+expected_r_max_depth_ignore_1 = [{'mode': 'NULLABLE', 'type': "RECORD", 'name': 'k_1', 'fields':
+                                  [{'mode': 'NULLABLE', 'type': "FLOAT", 'name': 'kk_3'}]}]
+expected_r_max_depth_stringify_1 = [{'mode': 'NULLABLE', 'type': "RECORD", 'name': 'k_1', 'fields':
+                                     [{'mode': 'NULLABLE', 'type': "STRING", 'name': 'kk_1'},
+                                      {'mode': 'REPEATED', 'type': "STRING", 'name': 'kk_2'},
+                                      {'mode': 'NULLABLE', 'type': "FLOAT", 'name': 'kk_3'}]}]
+
+@pytest.mark.parametrize("value, policy, expected_result",
+                         [(value_max_depth_1, "ignore", expected_r_max_depth_ignore_1),
+                          (value_max_depth_1, "stringify", expected_r_max_depth_stringify_1)])
+def test_max_depth(value, policy, expected_result):
+    schema_generator = SchemaGenerator(max_depth=1, max_depth_policy=policy)
+    schema_generator.update_schema_columns(value)
+    assert schema_generator.get_bq_schema() == expected_result
+
+def test_max_depth_exception():
+    schema_generator = SchemaGenerator(max_depth=1)
+    with pytest.raises(Exception, match="k_1.kk_1"):
+        schema_generator.update_schema_columns(value_max_depth_1)
+
+def test_max_depth_counts_records():
+    # Big Query's 15 levels of nested RECORDs, the deepest one holding a scalar
+    record = {"k_16": 1}
+    for level in range(15, 0, -1):
+        record = {f"k_{level}": record}
+    schema_generator = SchemaGenerator(max_depth=15)
+    schema_generator.update_schema_columns([record])
+    assert ".".join(f"k_{level}" for level in range(1, 17)) in schema_generator.schema_columns_dict
+    with pytest.raises(Exception, match="Maximum depth of 14 exceeded by column: k_1.k_2.k_3.k_4.k_5.k_6.k_7.k_8.k_9"):
+        SchemaGenerator(max_depth=14).update_schema_columns([record])
+
+def test_max_depth_stringify_needs_string():
+    type_lattice = TypeLattice({"FLOAT": ["RECORD"], "BOOLEAN": ["RECORD"], "RECORD": []})
+    with pytest.raises(Exception, match="needs a TypeLattice holding STRING"):
+        SchemaGenerator(type_lattice=type_lattice, max_depth=1, max_depth_policy="stringify")
+
+"""
+TEST array sampling
+"""
+
+value_array_sampling = [{"k_1": [1, 2, "a"], "k_2": [True, None], "k_3": [{"kk_1": 1}, 5, {"kk_2": "a"}]}]
+
+@pytest.mark.parametrize("array_sampling, expected_result", [
+    ("full", [{'mode': 'REPEATED', 'type': "STRING", 'name': 'k_1'},
+              {'mode': 'REPEATED', 'type': "BOOLEAN", 'name': 'k_2'},
+              {'mode': 'REPEATED', 'type': "RECORD", 'name': 'k_3', 'fields':
+                  [{'mode': 'NULLABLE', 'type': "FLOAT", 'name': 'kk_1'},
+                   {'mode': 'NULLABLE', 'type': "STRING", 'name': 'kk_2'}]}]),
+    ("first", [{'mode': 'REPEATED', 'type': "FLOAT", 'name': 'k_1'},
+               {'mode': 'REPEATED', 'type': "BOOLEAN", 'name': 'k_2'},
+               {'mode': 'REPEATED', 'type': "RECORD", 'name': 'k_3', 'fields':
+                   [{'mode': 'NULLABLE', 'type': "FLOAT", 'name': 'kk_1'}]}])])
+def test_array_sampling(array_sampling, expected_result):
+    schema_generator = SchemaGenerator(array_sampling=array_sampling, array_sample_size=2)
+    schema_generator.update_schema_columns(value_array_sampling)
+    assert schema_generator.get_bq_schema() == expected_result
+
+def test_array_sampling_reservoir():
+    values = list(range(1000))
+    # with a fixed seed, the single string is not sampled, while one of half strings is
+    schema_generator = SchemaGenerator(array_sampling="reservoir", array_sample_size=10, array_sample_seed=1)
+    assert schema_generator._get_type(values + ["a"]) == "FLOAT"
+    schema_generator = SchemaGenerator(array_sampling="reservoir", array_sample_size=10, array_sample_seed=1)
+    assert schema_generator._get_type(values[:10] + ["a"] * 10) == "STRING"
+    schema_generator = SchemaGenerator(array_sampling="reservoir", array_sample_size=10, array_sample_seed=1)
+    sample = schema_generator._sample_list(values)
+    assert sample == [137, 582, 867, 821, 782, 64, 261, 120, 507, 779]
+    assert len(set(sample)) == 10 and set(sample) <= set(values)
+
+def test_array_sampling_unknown_mode():
+    with pytest.raises(Exception):
+        SchemaGenerator(array_sampling="last")
@@ -0,0 +1,83 @@
+import pytest
+from bq_schema_generator.schema_generator import SchemaChange, SchemaGenerator
+from bq_schema_generator.state import STATE_MAGIC
+
+
+value_state_1 = [{"k_1": 10, "k_2": [True, False], "k_3": {"kk_1": "a", "kk_2": [{"kkk_1": 1.5}], "kk_3": {}}},
+                 {"k_1": "a", "k_4": "日本", "k.5": None}]
+
+@pytest.mark.parametrize("value", [value_state_1, []])
+def test_dump_load_state(value):
+    schema_generator = SchemaGenerator()
+    schema_generator.update_schema_columns(value)
+    state = schema_generator.dump_state()
+    assert state.startswith(STATE_MAGIC)
+
+    loaded_generator = SchemaGenerator()
+    loaded_generator.load_state(state)
+    assert loaded_generator.schema_columns_dict == schema_generator.schema_columns_dict
+    assert loaded_generator.get_bq_schema() == schema_generator.get_bq_schema()
+    assert loaded_generator.dump_state() == state
+
+def test_resume_from_state():
+    schema_generator = SchemaGenerator()
+    schema_generator.update_schema_columns(value_state_1[:1])
+    resumed_generator = SchemaGenerator()
+    resumed_generator.load_state(schema_generator.dump_state())
+    resumed_generator.update_schema_columns(value_state_1[1:])
+
+    serial_generator = SchemaGenerator()
+    serial_generator.update_schema_columns(value_state_1)
+    assert resumed_generator.get_bq_schema() == serial_generator.get_bq_schema()
+    # saturation is restored with the columns
+    assert resumed_generator._root.children["k_3"].children["kk_1"].saturated
+
+@pytest.mark.parametrize("value", [b"JSON{}", STATE_MAGIC + b"\x03"])
+def test_load_invalid_state(value):
+    with pytest.raises(Exception):
+        SchemaGenerator().load_state(value)
+
+def test_load_corrupted_state():
+    schema_generator = SchemaGenerator()
+    schema_generator.update_schema_columns(value_state_1)
+    state = schema_generator.dump_state()
+    for length in range(len(STATE_MAGIC), len(state)):
+        with pytest.raises(Exception, match="Not a SchemaGenerator state: truncated data"):
+            SchemaGenerator().load_state(state[:length])
+    with pytest.raises(Exception, match="Not a SchemaGenerator state: trailing data"):
+        SchemaGenerator().load_state(state + b"\x00")
+    # a single column whose type code points past the one-entry type table
+    with pytest.raises(Exception, match="Not a SchemaGenerator state: invalid type or mode code"):
+        SchemaGenerator().load_state(STATE_MAGIC + b"\x01\x01\x06STRING\x01\x08NULLABLE\x01\x03k_1\x02\x01\x00")
+
+def test_resume_seeded_from_state():
+    seed_schema = [{'mode': 'REQUIRED', 'type': "FLOAT", 'name': 'k_1'},
+                   {'mode': 'REQUIRED', 'type': "BYTES", 'name': 'k_2'},
+                   {'mode': 'REQUIRED', 'type': "FLOAT", 'name': 'k_3'}]
+    value = [{"k_1": 1.5, "k_2": "a", "k_3": None}, {"k_1": "text", "k_2": "b", "k_3": 2.5}]
+    schema_generator = SchemaGenerator(seed_schema=seed_schema)
+    schema_generator.update_schema_columns(value[:1])
+    resumed_generator = SchemaGenerator(seed_schema=seed_schema)
+    resumed_generator.load_state(schema_generator.dump_state())
+    resumed_generator.update_schema_columns(value[1:])
+
+    serial_generator = SchemaGenerator(seed_schema=seed_schema)
+    serial_generator.update_schema_columns(value)
+    assert resumed_generator.get_bq_schema() == serial_generator.get_bq_schema()
+    assert resumed_generator.schema_diff() == serial_generator.schema_diff() == [
+        SchemaChange("k_1", "type", "FLOAT", "STRING", False), SchemaChange("k_2", "type", "BYTES", "STRING", False),
+        SchemaChange("k_3", "mode", "REQUIRED", "NULLABLE", True)]
+    assert resumed_generator.dump_state() == serial_generator.dump_state()
+
+def test_load_version_1_state():
+    state = STATE_MAGIC + b"\x01\x01\x06STRING\x01\x08REQUIRED\x01\x03k_1\x01\x01\x00"
+    schema_generator = SchemaGenerator()
+    schema_generator.load_state(state)
+    assert schema_generator.get_bq_schema() == [{'mode': 'REQUIRED', 'type': "STRING", 'name': 'k_1'}]
+    assert schema_generator.schema_diff() == [SchemaChange("k_1", "added", None, "STRING", True)]
+
+def test_load_invalid_seed():
+    # an untyped column seeded as a STRING
+    with pytest.raises(Exception, match="Not a SchemaGenerator state: invalid seed for column: k_1"):
+        SchemaGenerator().load_state(STATE_MAGIC + b"\x02\x01\x06STRING\x01\x08NULLABLE"
+                                     b"\x01\x03k_1\x00\x00\x01\x01\x00\x00\x00")
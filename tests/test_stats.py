@@ -0,0 +1,43 @@
+import pytest
+from bq_schema_generator.schema_generator import SchemaGenerator
+from bq_schema_generator.stats import SchemaStats
+
+
+value_stats_1 = [{"k_1": True, "k_2": {"kk_1": 1, "kk_2": {"kkk_1": "a"}}},
+                 {"k_1": 1.5, "k_2": {"kk_1": "a"}, "k_3": None}]
+expected_r_stats_1 = {"records": 2, "fields": 9, "merges": 8, "widenings": 2, "max_depth": 3}
+
+@pytest.mark.parametrize("value, expected_result", [(value_stats_1, expected_r_stats_1)])
+def test_collect_stats(value, expected_result):
+    schema_generator = SchemaGenerator(collect_stats=True)
+    schema_generator.update_schema_columns(value)
+    schema_generator.get_bq_schema()
+    stats = schema_generator.stats.to_dict()
+    assert {key: stats[key] for key in expected_result} == expected_result
+    assert stats["phases"]["get_record_schema"]["calls"] == 2
+    assert stats["phases"]["update_schema_columns_dict"]["calls"] == 8
+    assert stats["phases"]["construct_bq_schema"]["calls"] == 1
+    assert stats["phases"]["get_record_schema"]["seconds"] > 0
+
+    # collecting stats does not change the schema
+    schema_generator_without_stats = SchemaGenerator()
+    schema_generator_without_stats.update_schema_columns(value)
+    assert schema_generator.get_bq_schema() == schema_generator_without_stats.get_bq_schema()
+
+
+def test_stats_disabled_by_default():
+    schema_generator = SchemaGenerator()
+    assert schema_generator.stats is None
+    assert "_get_record_schema" not in vars(schema_generator)
+
+
+def test_stats_to_prometheus():
+    stats = SchemaStats()
+    stats.records = 3
+    stats.phase_calls["construct_bq_schema"] = 1
+    text = stats.to_prometheus()
+    assert "# TYPE bq_schema_generator_records_total counter\nbq_schema_generator_records_total 3\n" in text
+    assert "# TYPE bq_schema_generator_max_depth gauge\nbq_schema_generator_max_depth 0\n" in text
+    assert 'bq_schema_generator_phase_calls_total{phase="construct_bq_schema"} 1\n' in text
+    stats.reset()
+    assert stats.to_dict()["records"] == 0
@@ -0,0 +1,56 @@
+import pytest
+from bq_schema_generator.schema_generator import SchemaGenerator, type_hierarchy
+from bq_schema_generator.type_lattice import TypeLattice
+
+
+type_lattice = TypeLattice(type_hierarchy)
+
+@pytest.mark.parametrize("current, incoming, expected_result", [("BOOLEAN", "STRING", "STRING"),
+                                                                ("STRING", "BOOLEAN", "STRING"),
+                                                                ("FLOAT", "RECORD", "RECORD"),
+                                                                ("RECORD", "STRING", "RECORD"),
+                                                                ("BOOLEAN", "FLOAT", "STRING"),
+                                                                ("FLOAT", "BOOLEAN", "STRING"),
+                                                                ("FLOAT", "FLOAT", "FLOAT")])
+def test_join(current, incoming, expected_result):
+    joined = type_lattice.join(type_lattice.code(current), type_lattice.code(incoming))
+    assert type_lattice.name(joined) == expected_result
+
+@pytest.mark.parametrize("value, expected_result", [("RECORD", True),
+                                                    ("STRING", False),
+                                                    ("FLOAT", False)])
+def test_top(value, expected_result):
+    assert type_lattice.top[type_lattice.code(value)] == expected_result
+
+def test_transitive_widening():
+    custom_lattice = TypeLattice({"INTEGER": ["FLOAT"], "FLOAT": ["STRING"]})
+    joined = custom_lattice.join(custom_lattice.code("INTEGER"), custom_lattice.code("STRING"))
+    assert custom_lattice.name(joined) == "STRING"
+
+def test_comparable():
+    custom_lattice = TypeLattice({"INTEGER": ["FLOAT"], "DATE": []})
+    integer, date, float_ = (custom_lattice.code(name) for name in ("INTEGER", "DATE", "FLOAT"))
+    assert custom_lattice.comparable(integer, float_)
+    # types without a common type keep the current one, so their join depends on the order
+    assert not custom_lattice.comparable(integer, date)
+    assert custom_lattice.join(integer, date) != custom_lattice.join(date, integer)
+
+def test_unknown_type():
+    with pytest.raises(Exception):
+        type_lattice.code("NULL")
+
+def test_custom_widening_rule():
+    custom_lattice = TypeLattice(type_hierarchy)
+    custom_lattice.add_widening("BOOLEAN", "FLOAT")
+    schema_generator = SchemaGenerator(type_lattice=custom_lattice)
+    schema_generator.update_schema_columns([{"k_1": True}, {"k_1": 1.5}])
+    assert schema_generator.get_bq_schema() == [{'mode': 'NULLABLE', 'type': "FLOAT", 'name': 'k_1'}]
+
+def test_copy():
+    type_lattice = TypeLattice(type_hierarchy)
+    copied_lattice = type_lattice.copy()
+    copied_lattice.add_widening("BYTES", "STRING")
+    assert "BYTES" not in type_lattice.codes
+    assert copied_lattice.names[:len(type_lattice.names)] == type_lattice.names
+    bytes_code, float_code = copied_lattice.code("BYTES"), copied_lattice.code("FLOAT")
+    assert copied_lattice.join(bytes_code, float_code) == copied_lattice.code("STRING")